@@ -0,0 +1,245 @@
+# benchmark.py
+"""
+Benchmark harness for the Name Matching System.
+
+This script:
+1. Generates synthetic name corpora by mutating the names_list groups
+   (typos, transliterations, added surnames)
+2. Measures cold start, per-query p50/p95/p99 latency for every matching
+   mode, batch throughput, peak RSS and recall@k against the exhaustive scan,
+   plus the recall / latency trade-off of the n-gram posting budget
+3. Writes the results as JSON so runs can be compared between releases
+
+Usage:
+python benchmark.py --sizes 10000 100000 --queries 200 --output bench.json
+"""
+
+# Imports
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import rapidfuzz
+
+import similarity
+from corpus import NameCorpus
+from ngram_index import DEFAULT_MAX_POSTINGS, default_max_postings
+from preprocess import names_list
+from snapshot import open_snapshot, write_snapshot
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+MODES = ["exhaustive", "ngram", "phonetic", "token"]
+
+# Per-query p99 latency the index modes are expected to stay under
+P99_TARGET_MS = 1.0
+
+SURNAMES = [
+    "Kumar", "Reddy", "Varma", "Sharma", "Rao", "Babu", "Devi", "Singh",
+    "Naidu", "Iyer", "Nair", "Patel", "Gupta", "Chowdary", "Pillai", "Das"
+]
+
+# Spelling swaps seen in transliterated names (applied both ways)
+TRANSLITERATIONS = [
+    ("ee", "i"), ("th", "t"), ("sh", "s"), ("oo", "u"), ("v", "w"),
+    ("aa", "a"), ("ks", "x"), ("ph", "f"), ("y", "i"), ("dh", "d")
+]
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+# Synthetic Data Generation
+def _typo(name: str, rng: random.Random) -> str:
+    if len(name) < 3:
+        return name
+    pos = rng.randrange(1, len(name) - 1)
+    kind = rng.choice(["swap", "delete", "insert", "replace"])
+    if kind == "swap":
+        return name[:pos] + name[pos + 1] + name[pos] + name[pos + 2:]
+    if kind == "delete":
+        return name[:pos] + name[pos + 1:]
+    if kind == "insert":
+        return name[:pos] + rng.choice(LETTERS) + name[pos:]
+    return name[:pos] + rng.choice(LETTERS) + name[pos + 1:]
+
+
+def _transliterate(name: str, rng: random.Random) -> str:
+    src, dst = rng.choice(TRANSLITERATIONS)
+    if rng.random() < 0.5:
+        src, dst = dst, src
+    return name.replace(src, dst, 1) if src in name else name
+
+
+def mutate_name(name: str, rng: random.Random) -> str:
+    """Applies one to three random mutations to a name."""
+    for _ in range(rng.randint(1, 3)):
+        kind = rng.random()
+        if kind < 0.4:
+            name = _typo(name, rng)
+        elif kind < 0.75:
+            name = _transliterate(name, rng)
+        elif len(name.split()) < 3:
+            name = f"{name} {rng.choice(SURNAMES)}"
+    return name
+
+
+def generate_corpus(size: int, seed: int = 42) -> list:
+    """Returns size synthetic names built from the names_list groups."""
+    rng = random.Random(seed)
+    groups = [names_list[i:i + 6] for i in range(0, len(names_list), 6)]
+    names = list(names_list[:size])
+    while len(names) < size:
+        names.append(mutate_name(rng.choice(rng.choice(groups)), rng))
+    return names
+
+
+def generate_queries(count: int, seed: int = 7) -> list:
+    """Returns mutated query names (a different seed than the corpus)."""
+    rng = random.Random(seed)
+    return [mutate_name(rng.choice(names_list), rng) for _ in range(count)]
+
+
+# Measurement Helpers
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(samples_ms: list) -> dict:
+    cuts = statistics.quantiles(samples_ms, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49], 4),
+        "p95_ms": round(cuts[94], 4),
+        "p99_ms": round(cuts[98], 4),
+        "mean_ms": round(statistics.fmean(samples_ms), 4),
+    }
+
+
+def measure_queries(queries: list, limit: int, mode: str, **options) -> dict:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        similarity.get_similarity_scores(query, limit=limit, mode=mode, **options)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def measure_recall(queries: list, expected: list, limit: int, mode: str, **options) -> float:
+    """recall@k of a mode against the exhaustive top-k sets in expected."""
+    total, found = 0, 0
+    for query, top in zip(queries, expected):
+        actual = {idx for _, _, idx in similarity.get_similarity_scores(query, limit, mode, **options)}
+        total += len(top)
+        found += len(top & actual)
+    return round(found / total, 4) if total else 1.0
+
+
+def run_size(size: int, queries: list, limit: int, modes: list) -> dict:
+    """Runs every measurement for one corpus size."""
+    result = {"size": size}
+    names = generate_corpus(size)
+
+    # Cold start: in-memory preprocessing and index builds
+    start = time.perf_counter()
+    corpus = NameCorpus(names)
+    result["cold_start_preprocess_s"] = round(time.perf_counter() - start, 4)
+    for mode in modes:
+        if mode != "exhaustive":
+            start = time.perf_counter()
+            getattr(corpus, f"{mode}_index")
+            result[f"cold_start_{mode}_index_s"] = round(time.perf_counter() - start, 4)
+
+    # Cold start: opening a snapshot of the same corpus
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.snap")
+        write_snapshot(path, corpus)
+        start = time.perf_counter()
+        snap = open_snapshot(path)
+        result["cold_start_snapshot_open_s"] = round(time.perf_counter() - start, 6)
+        start = time.perf_counter()
+        _ = snap.cleaned_names[size // 2]
+        result["cold_start_snapshot_names_s"] = round(time.perf_counter() - start, 4)
+        del snap, _
+
+    similarity.set_corpus(corpus)
+
+    result["latency"] = {mode: measure_queries(queries, limit, mode) for mode in modes}
+    result["meets_p99_target"] = {
+        mode: latency["p99_ms"] <= P99_TARGET_MS for mode, latency in result["latency"].items()
+    }
+    # Exhaustive top-k of every query, the reference for recall@k
+    expected = [{idx for _, _, idx in similarity.get_similarity_scores(query, limit)} for query in queries]
+    result["recall_at_k"] = {
+        mode: measure_recall(queries, expected, limit, mode) for mode in modes if mode != "exhaustive"
+    }
+
+    if "ngram" in modes:
+        # Recall / latency trade-off of the n-gram posting budget
+        budgets = {"fixed": DEFAULT_MAX_POSTINGS, "default": default_max_postings(size), "all": sys.maxsize}
+        result["ngram_max_postings"] = {
+            label: {
+                "max_postings": budget if budget != sys.maxsize else None,
+                "p99_ms": measure_queries(queries, limit, "ngram", max_postings=budget)["p99_ms"],
+                "recall_at_k": measure_recall(queries, expected, limit, "ngram", max_postings=budget),
+            }
+            for label, budget in budgets.items()
+        }
+
+    start = time.perf_counter()
+    similarity.get_similarity_scores_batch(queries, limit=limit)
+    elapsed = time.perf_counter() - start
+    result["batch_queries_per_s"] = round(len(queries) / elapsed, 1) if elapsed else None
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+# Command Line Benchmark
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the name matching engine.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200, help="queries per corpus size")
+    parser.add_argument("--limit", type=int, default=10, help="k for top-k and recall@k")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    queries = generate_queries(args.queries)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rapidfuzz": rapidfuzz.__version__,
+            "queries": args.queries,
+            "limit": args.limit,
+            "p99_target_ms": P99_TARGET_MS,
+        },
+        "results": [],
+    }
+
+    for size in args.sizes:
+        print(f"Benchmarking {size} names...")
+        result = run_size(size, queries, args.limit, args.modes)
+        report["results"].append(result)
+        print(json.dumps(result["latency"], indent=2))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
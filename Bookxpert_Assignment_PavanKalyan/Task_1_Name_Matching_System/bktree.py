@@ -0,0 +1,114 @@
+# bktree.py
+"""
+This module handles:
+1. A BK-tree (metric tree) over cleaned names using Levenshtein distance
+2. Incremental insertion of names
+3. "All names within distance d" queries that skip most of the corpus
+
+By the triangle inequality, only children whose edge distance lies in
+[d(query, node) - max_distance, d(query, node) + max_distance] can hold
+a match, so small max_distance values visit a small part of the tree.
+"""
+
+# Imports
+from rapidfuzz.distance import Levenshtein
+
+
+class BKTree:
+    """BK-tree of name ids keyed by Levenshtein distance."""
+
+    def __init__(self, names=()):
+        """
+        Parameters:
+        - names (iterable of str): Cleaned names; a name's id is its position.
+        """
+        self.size = 0
+        self.root = None  # node: [name, name_id, {edge_distance: child_node}]
+        self._owned = None  # set by copy(): ids of nodes this copy may modify
+
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return self.size
+
+    def _writable(self, node):
+        """Returns node, or a private copy of it if it is shared with another tree."""
+        if self._owned is None or id(node) in self._owned:
+            return node
+        node = [node[0], node[1], dict(node[2])]
+        self._owned.add(id(node))
+        return node
+
+    def add(self, name: str, name_id: int = None) -> int:
+        """
+        Inserts one cleaned name and returns its id.
+
+        Passing name_id inserts a new spelling for an existing id (e.g.
+        after a rename); by default the name gets the next free id.
+        """
+        if name_id is None:
+            name_id = self.size
+        self.size = max(self.size, name_id + 1)
+
+        new_node = [name, name_id, {}]
+        if self._owned is not None:
+            self._owned.add(id(new_node))
+
+        if self.root is None:
+            self.root = new_node
+            return name_id
+
+        # Nodes on the insertion path are copied first if they are shared
+        node = self.root = self._writable(self.root)
+        while True:
+            dist = Levenshtein.distance(name, node[0])
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = new_node
+                return name_id
+            child = node[2][dist] = self._writable(child)
+            node = child
+
+    def copy(self) -> "BKTree":
+        """
+        Returns a copy sharing all nodes with this tree. Inserting into
+        the copy only copies the nodes on the insertion path, so readers
+        of this tree are never affected.
+        """
+        clone = BKTree()
+        clone.size = self.size
+        clone.root = self.root
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def search(self, query: str, max_distance: int = 2, names=None) -> list:
+        """
+        Returns every name within max_distance edits of the query.
+
+        Parameters:
+        - query (str): The preprocessed query.
+        - max_distance (int): Largest Levenshtein distance to return.
+        - names (list): Current names by id; nodes whose name is no longer
+          current (removed or renamed) are skipped.
+
+        Returns:
+        - List of tuples: (name_id, distance), closest first
+        """
+        if self.root is None:
+            return []
+
+        matches = []
+        stack = [self.root]
+        while stack:
+            name, name_id, children = stack.pop()
+            dist = Levenshtein.distance(query, name)
+            if dist <= max_distance and (names is None or names[name_id] == name):
+                matches.append((name_id, dist))
+
+            low, high = dist - max_distance, dist + max_distance
+            stack.extend(child for edge, child in children.items() if low <= edge <= high)
+
+        matches.sort(key=lambda m: (m[1], m[0]))
+        return matches
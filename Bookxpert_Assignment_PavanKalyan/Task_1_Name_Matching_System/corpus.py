@@ -0,0 +1,168 @@
+# corpus.py
+"""
+This module handles:
+1. Holding the name corpus used by similarity.py
+2. Keeping cleaned names, original names and record ids side by side
+3. Building the candidate indexes lazily, on first use only
+4. Editing names (add / remove / rename) with incremental index updates
+
+Removed names leave a None tombstone so every other index stays valid.
+A corpus opened from a snapshot file (see snapshot.py) exposes the same
+attributes, so similarity.py does not care where the names came from.
+"""
+
+# Imports
+from functools import cached_property
+
+from bktree import BKTree
+from ngram_index import NGramIndex
+from phonetic import PhoneticIndex
+from token_index import TokenIndex
+from preprocess import preprocess_name, preprocess_names
+from versioned import ChunkedList
+
+
+# Corpus attributes holding the lazily built indexes
+INDEX_ATTRS = ("ngram_index", "phonetic_index", "token_index", "bk_tree")
+
+
+def indexable_names(cleaned_names):
+    """Yields the names to build an index from; tombstones become "" to keep ids aligned."""
+    return (name if name is not None else "" for name in cleaned_names)
+
+
+class NameCorpus:
+    """In-memory name corpus with lazily built indexes."""
+
+    def __init__(self, original_names, cleaned_names=None, ids=None):
+        """
+        Parameters:
+        - original_names (list of str): Names as they appear in the source.
+        - cleaned_names (list of str): Preprocessed names; computed if omitted.
+        - ids (list of int): Source record ids; defaults to positions.
+        """
+        self.original_names = list(original_names)
+
+        if cleaned_names is None:
+            cleaned_names = preprocess_names(self.original_names)
+        self.cleaned_names = list(cleaned_names)
+
+        self.ids = list(ids) if ids is not None else list(range(len(self.cleaned_names)))
+
+    def __len__(self):
+        return len(self.cleaned_names)
+
+    def extend(self, original_names, cleaned_names, ids=None) -> None:
+        """
+        Appends a chunk of names, adding them to any index already built.
+
+        Parameters:
+        - original_names (list of str): Names as they appear in the source.
+        - cleaned_names (list of str): Their preprocessed forms.
+        - ids (list of int): Source record ids; defaults to positions.
+        """
+        start = len(self.cleaned_names)
+        self.original_names.extend(original_names)
+        self.cleaned_names.extend(cleaned_names)
+        self.ids.extend(ids if ids is not None else range(start, len(self.cleaned_names)))
+
+        # Indexes that were not built yet will pick the names up on first use
+        for index in self._built_indexes():
+            for name in cleaned_names:
+                index.add(name)
+
+    def _built_indexes(self) -> list:
+        return [self.__dict__[attr] for attr in INDEX_ATTRS if attr in self.__dict__]
+
+    def add(self, original_name: str, record_id: int = None) -> int:
+        """Adds one name and returns its index."""
+        clean_name = preprocess_name(original_name)
+        if not clean_name:
+            raise ValueError("Please enter a valid name.")
+
+        self.extend([original_name], [clean_name], [record_id] if record_id is not None else None)
+        return len(self.cleaned_names) - 1
+
+    def remove(self, index: int) -> None:
+        """Removes the name at index, leaving a tombstone."""
+        old_name = self._live_name(index)
+        self.original_names[index] = None
+        self.cleaned_names[index] = None
+        self._discard(old_name, index)
+
+    def rename(self, index: int, original_name: str) -> None:
+        """Replaces the name at index, keeping its index and record id."""
+        clean_name = preprocess_name(original_name)
+        if not clean_name:
+            raise ValueError("Please enter a valid name.")
+
+        old_name = self._live_name(index)
+        self.original_names[index] = original_name
+        self.cleaned_names[index] = clean_name
+
+        self._discard(old_name, index)
+        for index_ in self._built_indexes():
+            index_.add(clean_name, index)
+
+    def _discard(self, old_name: str, index: int) -> None:
+        """Drops a removed or renamed name from the built indexes."""
+        # The id leaves the n-gram and phonetic postings of the old name, so
+        # it is no longer a candidate for it. Token postings and BK-tree
+        # nodes stay behind; lookups skip ids whose name changed.
+        if "token_index" in self.__dict__:
+            self.token_index.discard(old_name)
+        for attr in ("ngram_index", "phonetic_index"):
+            if attr in self.__dict__:
+                self.__dict__[attr].discard(old_name, index)
+
+    def _live_name(self, index: int) -> str:
+        if not 0 <= index < len(self.cleaned_names):
+            raise IndexError(f"No name at index {index}")
+        if self.cleaned_names[index] is None:
+            raise ValueError(f"The name at index {index} was removed")
+        return self.cleaned_names[index]
+
+    @cached_property
+    def ngram_index(self) -> NGramIndex:
+        """Trigram index over the cleaned names."""
+        return NGramIndex(indexable_names(self.cleaned_names))
+
+    @cached_property
+    def phonetic_index(self) -> PhoneticIndex:
+        """Phonetic code index over the cleaned names."""
+        return PhoneticIndex(indexable_names(self.cleaned_names))
+
+    @cached_property
+    def token_index(self) -> TokenIndex:
+        """Per-token given-name / surname index over the cleaned names."""
+        return TokenIndex(indexable_names(self.cleaned_names))
+
+    @cached_property
+    def bk_tree(self) -> BKTree:
+        """Levenshtein BK-tree over the cleaned names."""
+        return BKTree(indexable_names(self.cleaned_names))
+
+
+def _share(items) -> ChunkedList:
+    """Returns a copy-on-write copy of a name list (split into chunks on the first copy)."""
+    return items.copy() if isinstance(items, ChunkedList) else ChunkedList(items)
+
+
+def copy_corpus(corpus) -> NameCorpus:
+    """
+    Returns an editable NameCorpus copy of a NameCorpus or Snapshot.
+
+    The name lists (as ChunkedLists) and the indexes that were already
+    built are shared copy-on-write: the copy only copies the chunks and
+    id arrays it edits, so edits to the copy never show through the
+    original and copying a copy takes about the same time at any size.
+    """
+    clone = NameCorpus([], [], [])
+    clone.original_names = _share(corpus.original_names)
+    clone.cleaned_names = _share(corpus.cleaned_names)
+    clone.ids = _share(corpus.ids)
+    for attr in INDEX_ATTRS:
+        index = corpus.__dict__.get(attr)
+        if index is not None:
+            clone.__dict__[attr] = index.copy()
+    return clone
@@ -0,0 +1,232 @@
+# dedupe.py
+"""
+This module handles:
+1. Finding every pair of corpus names with a WRatio score above a threshold
+   (self-join), using the n-gram or phonetic index as a blocking stage so
+   each name is only scored against its candidates instead of all names
+2. Merging the pairs into clusters with union-find
+3. Picking a canonical representative for every cluster
+
+Scoring runs in a process pool. Workers reopen a snapshot by its path (its
+mapped sections cannot be pickled); an in-memory corpus is built in the
+parent first and inherited (fork) or pickled (spawn) with its index.
+
+Usage:
+python dedupe.py --threshold 90 --output clusters.jsonl
+"""
+
+# Imports
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from multiprocessing import Pool
+
+from rapidfuzz import process, fuzz
+
+from snapshot import Snapshot, open_snapshot
+
+
+DEFAULT_THRESHOLD = 90
+DEFAULT_CHUNK_SIZE = 2000
+# Candidates scored per name; with fewer, phonetic blocking splits the
+# clusters of common names (a bucket can hold thousands of them)
+DEFAULT_MAX_CANDIDATES = 400
+
+# Set in each worker process by _init_worker
+_WORKER_STATE = {}
+
+
+class UnionFind:
+    """Disjoint sets over integer ids with path compression and union by size."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.size[x] = 1
+            return x
+
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> int:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
+    def groups(self) -> dict:
+        """Returns {root: [member ids]} for every set seen so far."""
+        groups = defaultdict(list)
+        for x in self.parent:
+            groups[self.find(x)].append(x)
+        return groups
+
+
+# Worker Functions
+def _init_worker(source, blocking, threshold, max_candidates):
+    """source is a snapshot path or an in-memory NameCorpus."""
+    corpus = open_snapshot(source) if isinstance(source, str) else source
+    index = corpus.ngram_index if blocking == "ngram" else corpus.phonetic_index
+    _WORKER_STATE.update(names=corpus.cleaned_names, index=index, blocking=blocking,
+                         threshold=threshold, max_candidates=max_candidates)
+
+
+def _score_range(bounds):
+    """
+    Scores names[start:stop] against all their blocked candidates.
+
+    Pairs are scored from both ends, since the truncated candidate set of
+    one name may miss the other, and returned as (lower id, higher id).
+    """
+    start, stop = bounds
+    state = _WORKER_STATE
+    names, index = state["names"], state["index"]
+    pairs = []
+
+    for i in range(start, stop):
+        name = names[i]
+        if name is None:  # removed name
+            continue
+        # Both indexes cap the candidates, so a common surname's bucket is
+        # not scored against every other name in it
+        candidate_ids = index.get_candidates(name, state["max_candidates"])
+
+        choices = {j: names[j] for j in candidate_ids if j != i and names[j] is not None}
+        if not choices:
+            continue
+
+        for _, score, j in process.extract(name, choices, scorer=fuzz.WRatio,
+                                           score_cutoff=state["threshold"], limit=None):
+            pairs.append((min(i, j), max(i, j), score))
+
+    return stop - start, pairs
+
+
+# Self-Join Function
+def find_duplicate_pairs(corpus, threshold: float = DEFAULT_THRESHOLD, blocking: str = "ngram",
+                         max_candidates: int = DEFAULT_MAX_CANDIDATES, workers: int = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None) -> list:
+    """
+    Finds all pairs of names in a corpus scoring at least threshold.
+
+    Parameters:
+    - corpus (NameCorpus or Snapshot): Names to deduplicate.
+    - threshold (float): Minimum WRatio score for a pair.
+    - blocking (str): "ngram" or "phonetic" candidate index.
+    - max_candidates (int): Candidates per name (the names sharing the
+      most n-grams, or phonetic codes, with it).
+    - workers (int): Worker processes (default: all cores).
+    - chunk_size (int): Names per task sent to a worker.
+    - progress (callable): Called as progress(done, total) after each chunk.
+
+    Returns:
+    - List of tuples: (index_a, index_b, similarity_score) with index_a < index_b
+    """
+    if blocking not in ("ngram", "phonetic"):
+        raise ValueError(f"Unknown blocking mode: {blocking}")
+
+    if isinstance(corpus, Snapshot):
+        source = corpus.path
+    else:
+        # Built once here instead of in every worker
+        getattr(corpus, f"{blocking}_index")
+        source = corpus
+
+    total = len(corpus)
+    tasks = [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    initargs = (source, blocking, threshold, max_candidates)
+
+    # A pair found from both ends keeps its higher score (WRatio is not symmetric)
+    scores, done = {}, 0
+    with Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=initargs) as pool:
+        for count, chunk_pairs in pool.imap_unordered(_score_range, tasks):
+            for i, j, score in chunk_pairs:
+                if score > scores.get((i, j), -1):
+                    scores[(i, j)] = score
+            done += count
+            if progress:
+                progress(done, total)
+
+    return sorted((i, j, score) for (i, j), score in scores.items())
+
+
+# Clustering Function
+def cluster_pairs(corpus, pairs) -> list:
+    """
+    Merges duplicate pairs into clusters.
+
+    The canonical name of a cluster is the member linked to the most other
+    members (ties: the shorter name, then the lower index).
+
+    Returns:
+    - List of dicts: {"canonical": index, "name": cleaned name, "members": [indexes]},
+      largest cluster first
+    """
+    names = corpus.cleaned_names
+    uf = UnionFind()
+    degree = defaultdict(int)
+
+    for i, j, _ in pairs:
+        uf.union(i, j)
+        degree[i] += 1
+        degree[j] += 1
+
+    clusters = []
+    for members in uf.groups().values():
+        members.sort()
+        canonical = min(members, key=lambda m: (-degree[m], len(names[m]), m))
+        clusters.append({"canonical": canonical, "name": names[canonical], "members": members})
+
+    clusters.sort(key=lambda c: (-len(c["members"]), c["canonical"]))
+    return clusters
+
+
+def _print_progress(done: int, total: int) -> None:
+    print(f"\rScored {done}/{total} names ({100 * done / max(1, total):.1f}%)",
+          end="", file=sys.stderr, flush=True)
+
+
+# Command Line Deduplication
+if __name__ == "__main__":
+    from similarity import get_corpus
+
+    parser = argparse.ArgumentParser(description="Find and cluster near-duplicate names.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--blocking", choices=["ngram", "phonetic"], default="ngram")
+    parser.add_argument("--max-candidates", type=int, default=DEFAULT_MAX_CANDIDATES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="JSONL file for clusters (default: stdout)")
+    args = parser.parse_args()
+
+    corpus = get_corpus()
+    start = time.perf_counter()
+    pairs = find_duplicate_pairs(corpus, args.threshold, args.blocking, args.max_candidates,
+                                 args.workers, progress=_print_progress)
+    clusters = cluster_pairs(corpus, pairs)
+    print(f"\nFound {len(pairs)} pairs in {len(clusters)} clusters "
+          f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for cluster in clusters:
+            cluster["member_names"] = [corpus.original_names[m] for m in cluster["members"]]
+            out.write(json.dumps(cluster, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
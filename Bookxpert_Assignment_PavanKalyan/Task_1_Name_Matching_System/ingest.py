@@ -0,0 +1,155 @@
+# ingest.py
+"""
+This module handles:
+1. Streaming names out of CSV, JSONL or plain-text files
+2. Cleaning them in chunks with preprocess_names (one translate pass per chunk)
+3. Dropping exact duplicates of the normalized form
+4. Feeding the chunks straight into a NameCorpus (and its indexes)
+
+Only one chunk of raw rows is held at a time, so memory use does not
+depend on the file size (apart from the corpus being built).
+
+Usage:
+python ingest.py customers.csv --column name --output names.snap
+"""
+
+# Imports
+import argparse
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from corpus import NameCorpus
+from preprocess import preprocess_names
+
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+# File Readers
+def detect_format(path) -> str:
+    """Guesses the file format from the extension: csv, jsonl or text."""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".csv", ".tsv"):
+        return "csv"
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "text"
+
+
+def iter_names(path, fmt: str = None, column: str = "name", encoding: str = "utf-8"):
+    """
+    Yields raw names from a file one at a time.
+
+    Parameters:
+    - path (str): File to read.
+    - fmt (str): "csv", "jsonl" or "text"; detected from the extension if omitted.
+    - column (str): CSV column or JSON field holding the name.
+    - encoding (str): File encoding.
+    """
+    fmt = fmt or detect_format(path)
+
+    with open(path, "r", encoding=encoding, newline="") as f:
+        if fmt == "csv":
+            delimiter = "\t" if str(path).lower().endswith(".tsv") else ","
+            reader = csv.DictReader(f, delimiter=delimiter)
+            if reader.fieldnames is None or column not in reader.fieldnames:
+                raise ValueError(f"Column '{column}' not found in {path}")
+            for row in reader:
+                yield row[column]
+
+        elif fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line).get(column)
+
+        elif fmt == "text":
+            for line in f:
+                yield line.rstrip("\r\n")
+
+        else:
+            raise ValueError(f"Unknown file format: {fmt}")
+
+
+def iter_chunks(iterable, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yields lists of at most chunk_size items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Ingestion Pipeline
+def iter_clean_chunks(path, fmt: str = None, column: str = "name",
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, dedupe: bool = True):
+    """
+    Yields cleaned chunks of a name file.
+
+    Returns (per chunk):
+    - Tuple of three lists: (original_names, cleaned_names, row_ids)
+      Empty names are skipped; with dedupe, so are repeats of an
+      already seen cleaned name.
+    """
+    seen = set()
+    row_id = 0
+
+    for chunk in iter_chunks(iter_names(path, fmt, column), chunk_size):
+        cleaned = preprocess_names(chunk)
+        originals, kept, ids = [], [], []
+
+        for offset, (original, clean) in enumerate(zip(chunk, cleaned)):
+            if not clean or (dedupe and clean in seen):
+                continue
+            if dedupe:
+                seen.add(clean)
+            originals.append(original)
+            kept.append(clean)
+            ids.append(row_id + offset)
+
+        row_id += len(chunk)
+        yield originals, kept, ids
+
+
+def load_corpus(path, fmt: str = None, column: str = "name",
+                chunk_size: int = DEFAULT_CHUNK_SIZE, dedupe: bool = True,
+                corpus: NameCorpus = None) -> NameCorpus:
+    """
+    Streams a name file into a corpus.
+
+    Parameters:
+    - path (str): File to read.
+    - corpus (NameCorpus): Corpus to extend; a new one is created if omitted.
+
+    Returns:
+    - The NameCorpus; ids are the source row numbers.
+    """
+    corpus = corpus if corpus is not None else NameCorpus([])
+    for originals, cleaned, ids in iter_clean_chunks(path, fmt, column, chunk_size, dedupe):
+        corpus.extend(originals, cleaned, ids)
+    return corpus
+
+
+# Command Line Ingestion
+if __name__ == "__main__":
+    from snapshot import write_snapshot
+
+    parser = argparse.ArgumentParser(description="Load a name file and write a corpus snapshot.")
+    parser.add_argument("input", help="CSV, JSONL or plain-text file of names")
+    parser.add_argument("--format", choices=["csv", "jsonl", "text"], help="input format")
+    parser.add_argument("--column", default="name", help="CSV column / JSON field with the name")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--keep-duplicates", action="store_true", help="do not de-duplicate")
+    parser.add_argument("--output", default="names.snap", help="snapshot file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = load_corpus(args.input, args.format, args.column, args.chunk_size,
+                         dedupe=not args.keep_duplicates)
+    print(f"Loaded {len(corpus)} names in {time.perf_counter() - start:.2f}s")
+
+    write_snapshot(args.output, corpus)
+    print(f"Wrote snapshot to {args.output} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,221 @@
+# link_records.py
+"""
+Out-of-core record linkage: match every name of a (large) file against
+the name corpus and write the results incrementally.
+
+This script:
+1. Streams the query file in chunks (CSV, JSONL or plain text, see ingest.py)
+2. Scores the chunks with RapidFuzz in a pool of worker processes, keeping
+   only a bounded number of chunks in flight
+3. Writes (query, best_name, score, index, top_k) rows to CSV or JSONL in
+   input order
+4. Records a checkpoint after every chunk, so a crashed run resumes where
+   it stopped instead of starting over
+
+Usage:
+python link_records.py incoming.csv --column name --output matches.jsonl
+python link_records.py incoming.csv --column name --output matches.jsonl --resume
+"""
+
+# Imports
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import similarity
+from ingest import DEFAULT_CHUNK_SIZE, iter_chunks, iter_names
+
+
+OUTPUT_FIELDS = ["row", "query", "best_name", "score", "index", "top_k"]
+
+
+# Worker Function
+def _match_chunk(task):
+    """Scores one chunk of raw query names and returns its output rows."""
+    first_row, queries, limit, mode, score_cutoff = task
+
+    if mode == "exhaustive":
+        # One thread per worker process; the pool provides the parallelism
+        results = similarity.get_similarity_scores_batch(
+            queries, limit=limit, score_cutoff=score_cutoff, workers=1
+        )
+    else:
+        results = [
+            [m for m in similarity.get_similarity_scores(q, limit=limit, mode=mode) if m[1] >= score_cutoff]
+            if isinstance(q, str) else []
+            for q in queries
+        ]
+
+    rows = []
+    for offset, (query, matches) in enumerate(zip(queries, results)):
+        best = matches[0] if matches else (None, None, None)
+        rows.append({
+            "row": first_row + offset,
+            "query": query,
+            "best_name": best[0],
+            "score": round(best[1], 2) if best[1] is not None else None,
+            "index": best[2],
+            "top_k": [[name, round(score, 2), index] for name, score, index in matches],
+        })
+    return rows
+
+
+# Output Helpers
+def _format_rows(rows, fmt: str) -> str:
+    if fmt == "jsonl":
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=OUTPUT_FIELDS, lineterminator="\n")
+    for row in rows:
+        writer.writerow({**row, "top_k": json.dumps(row["top_k"], ensure_ascii=False)})
+    return buffer.getvalue()
+
+
+def _csv_header() -> str:
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=OUTPUT_FIELDS, lineterminator="\n").writeheader()
+    return buffer.getvalue()
+
+
+def _load_checkpoint(path: str, settings: dict):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("settings") != settings:
+        raise ValueError(f"Checkpoint {path} was written with different settings; "
+                         "remove it or run without --resume")
+    return checkpoint
+
+
+def _save_checkpoint(path: str, settings: dict, rows_done: int, output_bytes: int) -> None:
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "rows_done": rows_done, "output_bytes": output_bytes}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Linkage Function
+def link_records(input_path: str, output_path: str, column: str = "name", fmt: str = None,
+                 output_format: str = None, limit: int = 5, mode: str = "exhaustive",
+                 score_cutoff: float = 0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 workers: int = None, resume: bool = False, checkpoint_path: str = None) -> int:
+    """
+    Matches every name in input_path against the corpus.
+
+    Parameters:
+    - input_path (str): Query file (CSV, JSONL or plain text).
+    - output_path (str): Result file; ".csv" or ".jsonl" picks the format.
+    - column (str): CSV column / JSON field with the name.
+    - limit (int): Matches kept in top_k per query.
+    - mode (str): Matching mode passed to similarity.py.
+    - score_cutoff (float): Matches below this score are dropped.
+    - chunk_size (int): Query rows per task / checkpoint.
+    - workers (int): Worker processes (default: all cores).
+    - resume (bool): Continue from the checkpoint if one exists.
+
+    Returns:
+    - Number of rows written in this run.
+    """
+    output_format = output_format or ("csv" if output_path.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint.json"
+    settings = {"input": os.path.abspath(input_path), "column": column, "limit": limit,
+                "mode": mode, "score_cutoff": score_cutoff, "output_format": output_format}
+
+    checkpoint = _load_checkpoint(checkpoint_path, settings) if resume else None
+    rows_done = checkpoint["rows_done"] if checkpoint else 0
+
+    if checkpoint:
+        # Drop anything written after the last checkpoint; a shorter file lost
+        # rows the checkpoint counts as done, so it cannot be resumed
+        size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if size < checkpoint["output_bytes"]:
+            raise ValueError(f"{output_path} has {size} bytes but checkpoint {checkpoint_path} "
+                             f"expects {checkpoint['output_bytes']}; run without --resume")
+        out = open(output_path, "r+b")
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(0, os.SEEK_END)
+    else:
+        # A fresh run must not be resumed from an older run's checkpoint
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        out = open(output_path, "wb")
+        if output_format == "csv":
+            out.write(_csv_header().encode("utf-8"))
+
+    # Load the corpus (and any index) once, before the workers fork
+    corpus = similarity.get_corpus()
+    similarity.load_index(mode)
+
+    workers = workers or os.cpu_count() or 1
+    names = islice(iter_names(input_path, fmt, column), rows_done, None)
+    tasks = (
+        (rows_done + i * chunk_size, chunk, limit, mode, score_cutoff)
+        for i, chunk in enumerate(iter_chunks(names, chunk_size))
+    )
+
+    written, start = 0, time.perf_counter()
+    print(f"Linking {input_path} against {len(corpus)} names"
+          f"{f' (resuming at row {rows_done})' if rows_done else ''}", file=sys.stderr)
+
+    try:
+        with Pool(workers) as pool:
+            # At most two chunks per worker in flight keeps memory bounded
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_match_chunk, (task,)))
+                if len(pending) >= 2 * workers:
+                    written += _write_result(pending.popleft().get(), out, output_format,
+                                             checkpoint_path, settings)
+            while pending:
+                written += _write_result(pending.popleft().get(), out, output_format,
+                                         checkpoint_path, settings)
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} rows/s)",
+          file=sys.stderr)
+    return written
+
+
+def _write_result(rows, out, output_format: str, checkpoint_path: str, settings: dict) -> int:
+    """Appends one chunk of rows and records the checkpoint after it."""
+    if not rows:
+        return 0
+    out.write(_format_rows(rows, output_format).encode("utf-8"))
+    out.flush()
+    os.fsync(out.fileno())
+    _save_checkpoint(checkpoint_path, settings, rows[-1]["row"] + 1, out.tell())
+    return len(rows)
+
+
+# Command Line Linkage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match a name file against the name corpus.")
+    parser.add_argument("input", help="CSV, JSONL or plain-text file of names to match")
+    parser.add_argument("--output", required=True, help="result file (.csv or .jsonl)")
+    parser.add_argument("--column", default="name", help="CSV column / JSON field with the name")
+    parser.add_argument("--format", choices=["csv", "jsonl", "text"], help="input format")
+    parser.add_argument("--limit", type=int, default=5, help="matches kept per query")
+    parser.add_argument("--mode", default="exhaustive", help="matching mode (see similarity.py)")
+    parser.add_argument("--score-cutoff", type=float, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    args = parser.parse_args()
+
+    link_records(args.input, args.output, args.column, args.format, limit=args.limit,
+                 mode=args.mode, score_cutoff=args.score_cutoff, chunk_size=args.chunk_size,
+                 workers=args.workers, resume=args.resume)
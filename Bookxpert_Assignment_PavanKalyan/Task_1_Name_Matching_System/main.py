@@ -9,7 +9,7 @@ This script:
 """
 
 # Imports
-from similarity import get_similarity_scores, get_best_match
+from similarity import get_matches
 from colorama import Fore, Style, init
 
 # Initialize colors for Windows
@@ -28,8 +28,8 @@ def run_name_matching():
             print(Fore.RED + "\n Error: Please enter a valid name.")
             continue
 
-        # Best match
-        best = get_best_match(name)
+        # Best match + top matches in one pass
+        best, matches = get_matches(name, limit=10)
         if not best:
             print(Fore.RED + "\n No match found.")
             continue
@@ -41,9 +41,6 @@ def run_name_matching():
         print(Fore.CYAN + "----------------------------------------")
         print(Fore.MAGENTA + f"{best_name}  →  {best_score}%")
 
-        # Top matches
-        matches = get_similarity_scores(name, limit=10)
-
         print(Fore.CYAN + "\n----------------------------------------")
         print(Fore.YELLOW + " TOP SIMILAR MATCHES")
         print(Fore.CYAN + "----------------------------------------")
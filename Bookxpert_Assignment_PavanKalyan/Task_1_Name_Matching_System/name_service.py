@@ -0,0 +1,194 @@
+# name_service.py
+"""
+Async HTTP service for the Name Matching System.
+
+This module:
+1. Exposes get_matches (best match + top-k in one pass) over HTTP
+2. Caches results in a bounded LRU keyed on the preprocessed query + limit
+3. Runs scoring in a worker pool so the event loop never blocks
+4. Adds, renames and removes names live through name_store.NameStore
+
+Usage:
+uvicorn name_service:app --port 8001
+"""
+
+# Imports
+import asyncio
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from name_store import NameStore
+from preprocess import preprocess_name
+from similarity import get_corpus, get_matches
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+# Service settings (environment overridable)
+CACHE_SIZE = int(os.environ.get("NAME_CACHE_SIZE", "10000"))
+WORKERS = int(os.environ.get("NAME_SERVICE_WORKERS", str(os.cpu_count() or 1)))
+MAX_LIMIT = 100
+
+app = FastAPI(title="Name Matching API", version="1.0")
+
+# Scoring runs here, off the event loop
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="name-match")
+
+# Created on startup; every edit publishes a new corpus version
+store = None
+
+
+class MatchRequest(BaseModel):
+    name: str
+    limit: int = 10
+    mode: str = "exhaustive"
+    # Posting ids the n-gram index reads per query (None: size-based default)
+    max_postings: Optional[int] = None
+
+
+class NameRequest(BaseModel):
+    name: str
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_matches(clean_name: str, limit: int, mode: str, max_postings: Optional[int], version: int):
+    """
+    Scores one preprocessed query; results are cached by (query, limit,
+    mode, max_postings, corpus version), so entries from before an edit
+    are never served.
+    """
+    return get_matches(clean_name, limit=limit, mode=mode, max_postings=max_postings)
+
+
+def _as_dict(match) -> dict:
+    name, score, index = match
+    return {"name": name, "score": round(score, 2), "index": index}
+
+
+@app.on_event("startup")
+async def load_corpus():
+    # Load the corpus before the first request instead of during it
+    loop = asyncio.get_running_loop()
+    corpus = await loop.run_in_executor(executor, get_corpus)
+    global store
+    store = NameStore(corpus)
+    logger.info(f"Name corpus loaded: {len(corpus)} names")
+
+
+@app.get("/")
+async def read_root():
+    return {
+        "status": "Name Matching API is running",
+        "endpoints": {
+            "POST /match": "Best match and top similar names for a name",
+            "POST /names": "Add a name to the corpus",
+            "PUT /names/{index}": "Rename the name at an index",
+            "DELETE /names/{index}": "Remove the name at an index",
+            "GET /health": "Check API health and cache statistics"
+        }
+    }
+
+
+@app.get("/health")
+async def health_check():
+    info = _cached_matches.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "status": "healthy",
+        "corpus_version": store.version if store else 0,
+        "cache": {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0
+        }
+    }
+
+
+@app.post("/match")
+async def match_name(match_request: MatchRequest):
+    clean_name = preprocess_name(match_request.name)
+    if not clean_name:
+        raise HTTPException(status_code=400, detail="Please enter a valid name.")
+
+    if not 1 <= match_request.limit <= MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LIMIT}")
+
+    if match_request.max_postings is not None and match_request.max_postings < 1:
+        raise HTTPException(status_code=400, detail="max_postings must be at least 1")
+
+    loop = asyncio.get_running_loop()
+    best, matches = await loop.run_in_executor(
+        executor, _cached_matches, clean_name, match_request.limit, match_request.mode,
+        match_request.max_postings, store.version
+    )
+
+    return {
+        "status": "success",
+        "query": match_request.name,
+        "clean_query": clean_name,
+        "best_match": _as_dict(best) if best else None,
+        "matches": [_as_dict(m) for m in matches]
+    }
+
+
+@app.post("/names")
+async def add_name(name_request: NameRequest):
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(executor, store.add, name_request.name)
+    return {"status": "success", "index": index, "version": store.version}
+
+
+@app.put("/names/{index}")
+async def rename_name(index: int, name_request: NameRequest):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, store.rename, index, name_request.name)
+    return {"status": "success", "index": index, "version": store.version}
+
+
+@app.delete("/names/{index}")
+async def remove_name(index: int):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, store.remove, index)
+    return {"status": "success", "index": index, "version": store.version}
+
+
+@app.exception_handler(IndexError)
+async def index_error_handler(request: Request, exc: IndexError):
+    return JSONResponse(
+        status_code=404,
+        content={"detail": str(exc)},
+    )
+
+
+@app.exception_handler(ValueError)
+async def value_error_handler(request: Request, exc: ValueError):
+    return JSONResponse(
+        status_code=400,
+        content={"detail": str(exc)},
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "name_service:app",
+        host="0.0.0.0",
+        port=8001,
+        log_level="info",
+        workers=1
+    )
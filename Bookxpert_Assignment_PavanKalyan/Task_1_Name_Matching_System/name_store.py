@@ -0,0 +1,88 @@
+# name_store.py
+"""
+This module handles:
+1. Adding, removing and renaming individual names while the matcher is live
+2. Updating the cleaned names and every built index incrementally
+3. Publishing each change as a new immutable corpus version
+
+Writers take a lock, copy the current version (name lists and indexes
+are shared copy-on-write, see copy_corpus, so only the first copy of a
+corpus grows with its size), apply their edits to the copy and then
+publish it with a single reference swap. Queries read one version for
+their whole run and never take a lock, so they never see a half-built
+index.
+
+Usage:
+store = NameStore()
+index = store.add("Geetha Rani")
+store.rename(index, "Geetha Rani Devi")
+store.remove(index)
+"""
+
+# Imports
+import threading
+
+import similarity
+from corpus import copy_corpus
+
+
+class NameStore:
+    """Mutable name store behind similarity.py."""
+
+    def __init__(self, corpus=None, publish: bool = True):
+        """
+        Parameters:
+        - corpus (NameCorpus or Snapshot): Initial names; defaults to
+          similarity.get_corpus().
+        - publish (bool): Make every new version the corpus used by
+          similarity.py (set False to keep a private store).
+        """
+        self._lock = threading.Lock()
+        self._publish = publish
+        self.current = corpus if corpus is not None else similarity.get_corpus()
+        self.version = 0
+
+    def snapshot(self):
+        """Returns the current immutable corpus version."""
+        return self.current
+
+    def update(self, add=(), remove=(), rename=None) -> list:
+        """
+        Applies a batch of edits as one new version.
+
+        Parameters:
+        - add (iterable of str): Names to add.
+        - remove (iterable of int): Indexes of names to remove.
+        - rename (dict): {index: new name} for names to replace.
+
+        Returns:
+        - Indexes of the added names, in order.
+        """
+        with self._lock:
+            corpus = copy_corpus(self.current)
+
+            for index in remove:
+                corpus.remove(index)
+            for index, new_name in (rename or {}).items():
+                corpus.rename(index, new_name)
+            added = [corpus.add(name) for name in add]
+
+            # Publish: readers pick the new version up on their next query
+            self.current = corpus
+            self.version += 1
+            if self._publish:
+                similarity.set_corpus(corpus)
+
+        return added
+
+    def add(self, name: str) -> int:
+        """Adds a name and returns its index."""
+        return self.update(add=[name])[0]
+
+    def remove(self, index: int) -> None:
+        """Removes the name at index; other indexes do not change."""
+        self.update(remove=[index])
+
+    def rename(self, index: int, name: str) -> None:
+        """Replaces the name at index, keeping the index."""
+        self.update(rename={index: name})
@@ -0,0 +1,172 @@
+# ngram_index.py
+"""
+This module handles:
+1. Splitting cleaned names into character n-grams (trigrams by default)
+2. Building an inverted index: n-gram -> ids of the names containing it
+3. Returning a bounded candidate set ranked by shared n-gram count
+
+Counting runs in numpy over the posting arrays, reading the query's rarest
+n-grams first; once max_postings ids have been read, the remaining (most
+frequent, least selective) n-grams are skipped. By default max_postings
+grows with the corpus (a quarter of its size, at least 20000), which keeps
+recall close to counting every n-gram; a fixed small value bounds latency
+at any size instead, at a cost in recall (see benchmark.py).
+
+The index only prunes; the final ranking is still done with RapidFuzz in
+similarity.py, so only the candidates are scored with WRatio.
+"""
+
+# Imports
+import numpy as np
+
+from versioned import LayeredDict
+
+
+# Posting ids read per query before the most frequent n-grams are skipped:
+# at least DEFAULT_MAX_POSTINGS, or POSTINGS_SHARE of the corpus size
+DEFAULT_MAX_POSTINGS = 20000
+POSTINGS_SHARE = 0.25
+
+
+def default_max_postings(size: int) -> int:
+    """Returns the posting budget used for a corpus of size names."""
+    return max(DEFAULT_MAX_POSTINGS, int(size * POSTINGS_SHARE))
+
+
+def count_candidates(postings, size: int, max_candidates: int, max_postings: int) -> list:
+    """
+    Returns the ids found in the most posting arrays, reading the
+    shortest arrays first until max_postings ids have been read (the
+    shortest one is always read).
+
+    Parameters:
+    - postings (list): Id arrays (arrays or mapped snapshot sections).
+    - size (int): Corpus size (ids are below it).
+    - max_candidates (int): Upper bound on the returned ids.
+    - max_postings (int): Budget of ids read.
+
+    Returns:
+    - List of name ids, sorted ascending so ties rank like a full scan.
+    """
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+
+    # Arrays and mapped snapshot sections are both read without a copy
+    arrays, read = [], 0
+    for ids in postings:
+        if arrays and read + len(ids) > max_postings:
+            break
+        arrays.append(np.frombuffer(ids, dtype=np.uint32))
+        read += len(ids)
+
+    ids = np.concatenate(arrays)
+    if read * 8 < size:
+        candidates, counts = np.unique(ids, return_counts=True)
+    else:
+        # Large reads: a dense count per id beats sorting them
+        counts = np.bincount(ids, minlength=size)
+        candidates = np.flatnonzero(counts)
+        counts = counts[candidates]
+
+    if len(candidates) > max_candidates:
+        # The highest count that max_candidates names reach; of the names
+        # with exactly that count, the lower ids are kept
+        at_least = np.cumsum(np.bincount(counts)[::-1])[::-1]
+        cut = int(np.flatnonzero(at_least >= max_candidates)[-1])
+        above = candidates[counts > cut]
+        tied = candidates[counts == cut][:max_candidates - len(above)]
+        candidates = np.sort(np.concatenate((above, tied)))
+
+    return candidates.tolist()
+
+
+# Helper Function
+def get_ngrams(text: str, n: int = 3) -> set:
+    """
+    Returns the set of character n-grams of a cleaned name.
+
+    The name is padded with one space on each side so that short names
+    and word boundaries still produce n-grams.
+
+    Example:
+    get_ngrams("gita") -> {" gi", "git", "ita", "ta "}
+    """
+    if not text:
+        return set()
+
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NGramIndex:
+    """Inverted index from character n-grams to name ids."""
+
+    def __init__(self, names=(), n: int = 3):
+        """
+        Parameters:
+        - names (iterable of str): Cleaned names; a name's id is its position.
+        - n (int): Length of the character n-grams.
+        """
+        self.n = n
+        self.size = 0
+        self.postings = LayeredDict()
+
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str, name_id: int = None) -> int:
+        """
+        Indexes one cleaned name and returns its id.
+
+        Passing name_id re-indexes an existing id (e.g. after a rename);
+        by default the name gets the next free id.
+        """
+        if name_id is None:
+            name_id = self.size
+        for gram in get_ngrams(name, self.n):
+            # Ids shared with another version of the index (or mapped
+            # from a snapshot) are copied on first write
+            self.postings.append(gram, name_id)
+
+        self.size = max(self.size, name_id + 1)
+        return name_id
+
+    def discard(self, name: str, name_id: int) -> None:
+        """Removes an id from the postings of its old name (e.g. after a rename)."""
+        for gram in get_ngrams(name, self.n):
+            self.postings.discard(gram, name_id)
+
+    def copy(self) -> "NGramIndex":
+        """
+        Returns a copy sharing every id list with this index; whichever of
+        the two is written to copies the lists it touches first.
+        """
+        clone = NGramIndex(n=self.n)
+        clone.size = self.size
+        clone.postings = self.postings.copy()
+        return clone
+
+    def get_candidates(self, clean_input: str, max_candidates: int = 100,
+                       max_postings: int = None) -> list:
+        """
+        Returns the ids of the names sharing the most n-grams with the input.
+
+        Parameters:
+        - clean_input (str): The preprocessed query.
+        - max_candidates (int): Upper bound on the candidate set (recall knob).
+        - max_postings (int): Posting ids read before the most frequent
+          n-grams are skipped (latency knob; default: default_max_postings);
+          the rarest n-gram is always read.
+
+        Returns:
+        - List of name ids, sorted ascending so ties rank like a full scan.
+        """
+        if max_postings is None:
+            max_postings = default_max_postings(self.size)
+        postings = [self.postings[gram] for gram in get_ngrams(clean_input, self.n)
+                    if gram in self.postings]
+        return count_candidates(postings, self.size, max_candidates, max_postings)
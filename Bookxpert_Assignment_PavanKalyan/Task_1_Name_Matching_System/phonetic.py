@@ -0,0 +1,167 @@
+# phonetic.py
+"""
+This module handles:
+1. Computing phonetic codes for cleaned names (Soundex + consonant skeleton)
+2. Building a phonetic code -> name ids hash map (blocking index)
+3. Returning the ids of names that sound like the input
+
+Two codes are computed per word, similar to Double Metaphone's primary and
+alternate keys, so Geeta/Geetha/Gita and Rahul/Rahool/Ragul share a bucket.
+
+Buckets of common surnames hold a large share of the corpus, so lookups
+return at most max_candidates ids, those sharing the most codes with the
+input, and skip the largest buckets past max_postings ids (counted as in
+ngram_index.py).
+"""
+
+# Imports
+from ngram_index import count_candidates, default_max_postings
+from versioned import LayeredDict
+
+
+# Soundex digit for each consonant; vowels, h, w and y are dropped
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+# Spelling variants common in transliterated Indian names
+TRANSLITERATIONS = [
+    ("sh", "s"), ("th", "t"), ("dh", "d"), ("bh", "b"), ("ph", "f"),
+    ("kh", "k"), ("gh", "g"), ("ch", "c"), ("ks", "x"), ("w", "v"),
+    ("z", "j"), ("q", "k"), ("ck", "k"), ("g", "k"),
+]
+
+VOWELS = set("aeiouy")
+
+
+# Phonetic Code Functions
+def soundex(word: str) -> str:
+    """Returns the classic 4-character Soundex code of a word."""
+    word = "".join(ch for ch in word if ch.isalpha())
+    if not word:
+        return ""
+
+    code = word[0].upper()
+    last = SOUNDEX_CODES.get(word[0], "")
+
+    for ch in word[1:]:
+        digit = SOUNDEX_CODES.get(ch, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate equal codes, vowels do
+        if ch not in "hw":
+            last = digit
+
+    return code.ljust(4, "0")
+
+
+def skeleton_key(word: str) -> str:
+    """
+    Returns the first letter plus the de-duplicated consonant skeleton of
+    a word after folding common transliteration variants.
+
+    Example:
+    skeleton_key("keerun") -> "krn"
+    skeleton_key("ragul") -> "rkl"
+    """
+    word = "".join(ch for ch in word if ch.isalpha())
+    if not word:
+        return ""
+
+    for src, dst in TRANSLITERATIONS:
+        word = word.replace(src, dst)
+
+    key = word[0]
+    for ch in word[1:]:
+        if ch in VOWELS or ch == "h" or ch == key[-1]:
+            continue
+        key += ch
+
+    return key
+
+
+def get_phonetic_codes(clean_name: str) -> set:
+    """Returns every phonetic code of every word in a cleaned name."""
+    codes = set()
+    for word in clean_name.split():
+        codes.add("S:" + soundex(word))
+        codes.add("K:" + skeleton_key(word))
+
+    codes.discard("S:")
+    codes.discard("K:")
+    return codes
+
+
+class PhoneticIndex:
+    """Hash map from phonetic codes to name ids."""
+
+    def __init__(self, names=()):
+        """
+        Parameters:
+        - names (iterable of str): Cleaned names; a name's id is its position.
+        """
+        self.size = 0
+        self.buckets = LayeredDict()
+
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str, name_id: int = None) -> int:
+        """
+        Indexes one cleaned name and returns its id.
+
+        Passing name_id re-indexes an existing id (e.g. after a rename);
+        by default the name gets the next free id.
+        """
+        if name_id is None:
+            name_id = self.size
+        for code in get_phonetic_codes(name):
+            # Ids shared with another version of the index (or mapped
+            # from a snapshot) are copied on first write
+            self.buckets.append(code, name_id)
+
+        self.size = max(self.size, name_id + 1)
+        return name_id
+
+    def discard(self, name: str, name_id: int) -> None:
+        """Removes an id from the buckets of its old name (e.g. after a rename)."""
+        for code in get_phonetic_codes(name):
+            self.buckets.discard(code, name_id)
+
+    def copy(self) -> "PhoneticIndex":
+        """
+        Returns a copy sharing every id list with this index; whichever of
+        the two is written to copies the lists it touches first.
+        """
+        clone = PhoneticIndex()
+        clone.size = self.size
+        clone.buckets = self.buckets.copy()
+        return clone
+
+    def get_candidates(self, clean_input: str, max_candidates: int = 100,
+                       max_postings: int = None) -> list:
+        """
+        Returns the ids of the names sharing the most phonetic codes with the input.
+
+        Parameters:
+        - clean_input (str): The preprocessed query.
+        - max_candidates (int): Upper bound on the candidate set.
+        - max_postings (int): Bucket ids read before the largest buckets
+          are skipped (default: default_max_postings); the smallest
+          bucket is always read.
+
+        Returns:
+        - List of name ids, sorted ascending so ties rank like a full scan.
+        """
+        if max_postings is None:
+            max_postings = default_max_postings(self.size)
+        buckets = [self.buckets[code] for code in get_phonetic_codes(clean_input)
+                   if code in self.buckets]
+        return count_candidates(buckets, self.size, max_candidates, max_postings)
@@ -33,25 +33,39 @@ names_list = [
     "Varun", "Varun Kumar", "Varunsai", "Varundev", "Varunan", "Varrun"
 ]
 
+# Remove commas, dots, hyphens, underscores in one translate pass
+REMOVE_CHARS = str.maketrans("", "", ",.-_")
+
 # Preprocessing function
 def preprocess_name(name: str) -> str:
     """Cleans a name by lowercasing, trimming spaces, removing symbols."""
     if not isinstance(name, str):
         return ""
 
-    clean_name = name.lower().strip()
-
-    # Remove commas, dots, hyphens, underscores
-    for ch in [",", ".", "-", "_"]:
-        clean_name = clean_name.replace(ch, "")
-
+    clean_name = name.lower().translate(REMOVE_CHARS)
     clean_name = " ".join(clean_name.split())  # remove extra spaces
     return clean_name
 
+# Bulk preprocessing function
+def preprocess_names(names) -> list:
+    """
+    Cleans a whole chunk of names with one lower() and one translate() pass
+    over the joined text instead of one pass per name.
+    """
+    names = [n if isinstance(n, str) else "" for n in names]
+    text = "\n".join(names).lower().translate(REMOVE_CHARS)
+    lines = text.split("\n")
+
+    # A name containing a newline would shift the split; clean one by one
+    if len(lines) != len(names):
+        return [preprocess_name(n) for n in names]
+
+    return [" ".join(line.split()) for line in lines]
+
 # Generate a cleaned version of the names_list
 def get_cleaned_names() -> list:
     """Returns a list of cleaned/preprocessed names from the dataset."""
-    return [preprocess_name(n) for n in names_list]
+    return preprocess_names(names_list)
 
 # Print count to verify dataset quality
 if __name__ == "__main__":
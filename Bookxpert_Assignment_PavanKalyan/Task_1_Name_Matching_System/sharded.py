@@ -0,0 +1,205 @@
+# sharded.py
+"""
+This module handles:
+1. Splitting the name corpus into N contiguous shards
+2. Keeping each shard (and its indexes) in a long-lived worker process
+3. Fanning every query out to all shards and merging the per-shard top-k
+   into the same ranked (name, score, index) list get_similarity_scores
+   returns, with indexes into the full corpus
+
+Workers opened on a snapshot file map it themselves and decode only their
+own range of names, so the file pages are shared between them; without a
+snapshot the corpus is inherited from the parent process (fork) or sent
+to each worker once (spawn).
+
+In "phonetic" mode the shards never fall back to a full scan on their own:
+the parent adds up their bucket sizes and runs the exhaustive scan on all
+shards when the total is below min_candidates, as a single process would.
+
+Note: in "token" mode each shard computes IDF weights over its own names,
+and in "ngram" and "phonetic" mode each shard keeps (or adds) its own
+max_candidates n-gram candidates, so scores (token) or the names scored
+(ngram, phonetic) can differ slightly from a single-process run.
+
+Usage:
+with ShardedMatcher(shards=4, modes=["ngram"]) as matcher:
+    matcher.get_similarity_scores("Geetha", limit=10, mode="ngram")
+"""
+
+# Imports
+import heapq
+import multiprocessing
+import os
+import threading
+
+import similarity
+from corpus import NameCorpus
+from preprocess import preprocess_name
+from snapshot import open_snapshot
+
+
+# Worker Process
+def _shard_worker(conn, start: int, stop: int, snapshot_path, names, modes):
+    """Serves queries for names[start:stop] until it receives None."""
+    try:
+        if snapshot_path:
+            shard = NameCorpus(*open_snapshot(snapshot_path).names_range(start, stop))
+        else:
+            shard = NameCorpus(names[0][start:stop], names[1][start:stop])
+
+        similarity.set_corpus(shard)
+        for mode in modes:
+            similarity.load_index(mode)
+    except Exception as e:
+        conn.send(("error", f"shard {start}-{stop} failed to load: {e}"))
+        return
+
+    conn.send(("ready", len(shard)))
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+
+        input_name, limit, mode, options = message
+        try:
+            results = similarity.get_similarity_scores(input_name, limit, mode, **options)
+            # Names in this shard's buckets (at most max_candidates are
+            # counted), for the parent's full-scan decision
+            matched = None
+            if mode == "phonetic":
+                matched = len(shard.phonetic_index.get_candidates(
+                    preprocess_name(input_name), options.get("max_candidates") or similarity.DEFAULT_MAX_CANDIDATES,
+                    options.get("max_postings")))
+            conn.send(("ok", [(name, score, start + i) for name, score, i in results], matched))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+    conn.close()
+
+
+class ShardedMatcher:
+    """Fans queries out to N shard worker processes and merges the results."""
+
+    def __init__(self, shards: int = None, snapshot_path: str = None, corpus=None,
+                 modes=("exhaustive",)):
+        """
+        Parameters:
+        - shards (int): Number of shard processes (default: all cores).
+        - snapshot_path (str): Snapshot to map in every worker; defaults to
+          similarity.SNAPSHOT_PATH when that file exists.
+        - corpus (NameCorpus): Corpus to shard when no snapshot is used;
+          defaults to similarity.get_corpus().
+        - modes (iterable of str): Matching modes whose indexes each shard
+          builds up front.
+        """
+        shards = shards or os.cpu_count() or 1
+
+        if snapshot_path is None and corpus is None and os.path.exists(similarity.SNAPSHOT_PATH):
+            snapshot_path = similarity.SNAPSHOT_PATH
+
+        if snapshot_path:
+            total = len(open_snapshot(snapshot_path))
+            names = None
+        else:
+            corpus = corpus if corpus is not None else similarity.get_corpus()
+            total = len(corpus)
+            names = (corpus.original_names, corpus.cleaned_names)
+
+        shards = max(1, min(shards, total))
+        bounds = [(total * i // shards, total * (i + 1) // shards) for i in range(shards)]
+
+        # fork shares the parent's corpus pages; spawn pickles the names once
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(method)
+
+        self.size = total
+        self._lock = threading.Lock()
+        self._workers = []
+        for start, stop in bounds:
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_shard_worker,
+                args=(child_conn, start, stop, snapshot_path, names, tuple(modes)),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._workers.append((process, parent_conn))
+
+        for _, conn in self._workers:
+            status, detail = conn.recv()
+            if status != "ready":
+                self.close()
+                raise RuntimeError(detail)
+
+    def get_similarity_scores(self, input_name: str, limit: int = 10, mode: str = "exhaustive",
+                              **options):
+        """
+        Same contract as similarity.get_similarity_scores, over all shards.
+
+        Returns:
+        - List of tuples: (matched_name, similarity_score, index)
+        """
+        if not input_name or not isinstance(input_name, str):
+            return []
+
+        if mode == "phonetic":
+            # The full-scan fallback depends on all buckets, not one shard's
+            min_candidates = options.pop("min_candidates", None)
+            min_candidates = limit if min_candidates is None else min_candidates
+            replies = self._query(input_name, limit, mode, {**options, "min_candidates": 0})
+            if sum(reply[2] for reply in replies) < min_candidates:
+                replies = self._query(input_name, limit, "exhaustive", {})
+        else:
+            replies = self._query(input_name, limit, mode, options)
+
+        # Highest score first, lower corpus index first on ties
+        merged = heapq.merge(*(reply[1] for reply in replies), key=lambda m: (-m[1], m[2]))
+        return list(merged)[:limit]
+
+    def _query(self, input_name: str, limit: int, mode: str, options: dict) -> list:
+        """Sends one query to every shard and returns their ("ok", results, ...) replies."""
+        message = (input_name, limit, mode, options)
+        with self._lock:
+            for _, conn in self._workers:
+                conn.send(message)
+            replies = [conn.recv() for _, conn in self._workers]
+
+        for reply in replies:
+            if reply[0] != "ok":
+                raise ValueError(reply[1])
+        return replies
+
+    def get_best_match(self, input_name: str, mode: str = "exhaustive"):
+        results = self.get_similarity_scores(input_name, limit=1, mode=mode)
+        return results[0] if results else None
+
+    def close(self) -> None:
+        """Stops every shard worker."""
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Debugging / Test Run
+if __name__ == "__main__":
+    with ShardedMatcher(shards=2, modes=["ngram"]) as matcher:
+        for mode in ("exhaustive", "ngram"):
+            sharded = matcher.get_similarity_scores("Geetha", limit=5, mode=mode)
+            single = similarity.get_similarity_scores("Geetha", limit=5, mode=mode)
+            print(f"{mode}: {sharded}")
+            print(f"  same as single process: {sharded == single}")
@@ -0,0 +1,309 @@
+# snapshot.py
+"""
+This module handles:
+1. Writing a name corpus (cleaned names, original names, ids, indexes)
+   to a compact, versioned on-disk snapshot
+2. Opening a snapshot lazily through mmap, so startup is close to O(1)
+   and several worker processes share one copy of the pages
+
+File layout:
+- Fixed header: magic, format version, JSON header length, JSON header CRC32
+- JSON header: name count, byte order and a table of sections
+  (offset, length, CRC32 and type of each section)
+- Sections, 8-byte aligned: concatenated UTF-8 text (with a companion
+  "<name>_offsets" array of string boundaries) or raw integer arrays
+
+Each section's CRC32 is checked the first time the section is used.
+Names are read straight from the mapped text through the offsets, so
+they are never copied into a per-process list; any character, newlines
+included, can appear in a name. Removed names (None tombstones) are
+stored as empty strings.
+
+A snapshot is written to a temporary file, checked by reading it back and
+then moved over the target, so a process that has the old file mapped
+keeps reading the old file.
+
+Usage:
+python snapshot.py --output names.snap
+"""
+
+# Imports
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from collections.abc import Sequence
+from functools import cached_property
+
+from bktree import BKTree
+from corpus import indexable_names
+from ngram_index import NGramIndex
+from phonetic import PhoneticIndex
+from token_index import TokenIndex
+from versioned import LayeredDict
+
+
+MAGIC = b"NAMESNAP"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sHHII")  # magic, version, reserved, json length, json crc
+ALIGNMENT = 8
+# Strings decoded per block when a text section is iterated
+TEXT_BLOCK = 8192
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is missing, corrupt or of another version."""
+
+
+# Section Encoding Helpers
+def _encode_text(name: str, strings) -> dict:
+    """Encodes strings as a text section plus the array of their byte offsets."""
+    offsets = array("Q", [0])
+    data = bytearray()
+    for string in strings:
+        data += string.encode("utf-8")
+        offsets.append(len(data))
+
+    return {name: ("text", bytes(data)), f"{name}_offsets": ("Q", offsets.tobytes())}
+
+
+class MappedText(Sequence):
+    """Read-only list of the strings of a mapped text section; "" reads as None."""
+
+    def __init__(self, data, offsets):
+        """
+        Parameters:
+        - data (memoryview): The text section.
+        - offsets (memoryview): Its offsets section (one more than the strings).
+        """
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MappedText index out of range")
+
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return str(self._data[start:end], "utf-8") if end > start else None
+
+    def __iter__(self):
+        # Full scans copy a block of text at a time, then decode name by name
+        for first in range(0, len(self), TEXT_BLOCK):
+            bounds = self._offsets[first:min(len(self), first + TEXT_BLOCK) + 1].tolist()
+            base = bounds[0]
+            block = bytes(self._data[base:bounds[-1]])
+            for start, end in zip(bounds, bounds[1:]):
+                yield block[start - base:end - base].decode("utf-8") if end > start else None
+
+
+def _encode_postings(postings: dict) -> dict:
+    """Flattens a {key: ids} mapping into key text, offsets and ids sections."""
+    keys = list(postings)
+    offsets = array("Q", [0])
+    ids = array("I")
+    for key in keys:
+        ids.extend(postings[key])
+        offsets.append(len(ids))
+
+    return {**_encode_text("keys", keys), "offsets": ("Q", offsets.tobytes()),
+            "ids": ("I", ids.tobytes())}
+
+
+# Build Step
+def write_snapshot(path: str, corpus) -> None:
+    """
+    Writes a corpus and its indexes to a snapshot file.
+
+    The file is written next to path under a temporary name, read back and
+    compared with the corpus, flushed to disk and only then renamed over
+    path, so readers never see a partly written snapshot.
+
+    Parameters:
+    - path (str): Output file path.
+    - corpus (NameCorpus): The corpus to store.
+    """
+    sections = {
+        **_encode_text("cleaned_names", indexable_names(corpus.cleaned_names)),
+        **_encode_text("original_names", indexable_names(corpus.original_names)),
+        "ids": ("Q", array("Q", corpus.ids).tobytes()),
+    }
+
+    for prefix, postings in (("ngram", corpus.ngram_index.postings),
+                             ("phonetic", corpus.phonetic_index.buckets)):
+        for part, section in _encode_postings(postings).items():
+            sections[f"{prefix}_{part}"] = section
+
+    table = {}
+    offset = 0
+    for name, (kind, data) in sections.items():
+        offset += -offset % ALIGNMENT
+        table[name] = {"offset": offset, "length": len(data), "type": kind,
+                       "crc32": zlib.crc32(data)}
+        offset += len(data)
+
+    header = json.dumps({
+        "count": len(corpus),
+        "byteorder": sys.byteorder,
+        "ngram_n": corpus.ngram_index.n,
+        "sections": table,
+    }).encode("utf-8")
+
+    # Sections start on an aligned offset after the headers
+    base = HEADER.size + len(header)
+    base += -base % ALIGNMENT
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(header), zlib.crc32(header)))
+            f.write(header)
+            for name, (_, data) in sections.items():
+                f.seek(base + table[name]["offset"])
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        _check_round_trip(tmp_path, corpus)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _check_round_trip(path: str, corpus) -> None:
+    """Raises SnapshotError unless the snapshot at path reads back as corpus."""
+    snapshot = Snapshot(path)
+    for attr in ("cleaned_names", "original_names"):
+        stored = getattr(snapshot, attr)
+        if len(stored) != len(corpus) or any(
+                a != (b or None) for a, b in zip(stored, getattr(corpus, attr))):
+            raise SnapshotError(f"{path}: {attr} do not read back as written")
+    if list(snapshot.ids) != list(corpus.ids):
+        raise SnapshotError(f"{path}: ids do not read back as written")
+
+
+class Snapshot:
+    """A memory-mapped snapshot with the same attributes as NameCorpus."""
+
+    def __init__(self, path: str):
+        """Maps the file and reads the headers; sections load on first use."""
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size:
+            raise SnapshotError(f"{path}: file too small to be a snapshot")
+
+        magic, version, _, header_len, header_crc = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a name snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{path}: snapshot version {version}, expected {FORMAT_VERSION}")
+
+        header = self._mmap[HEADER.size:HEADER.size + header_len]
+        if zlib.crc32(header) != header_crc:
+            raise SnapshotError(f"{path}: header checksum mismatch")
+
+        self.header = json.loads(header)
+        if self.header["byteorder"] != sys.byteorder:
+            raise SnapshotError(f"{path}: written on a {self.header['byteorder']}-endian host")
+
+        self._base = HEADER.size + header_len
+        self._base += -self._base % ALIGNMENT
+        self._count = self.header["count"]
+
+    def __len__(self):
+        return self._count
+
+    def _section(self, name: str):
+        """Returns a checksum-verified memoryview of one section."""
+        info = self.header["sections"][name]
+        start = self._base + info["offset"]
+        view = memoryview(self._mmap)[start:start + info["length"]]
+        if zlib.crc32(view) != info["crc32"]:
+            raise SnapshotError(f"{self.path}: section '{name}' checksum mismatch")
+
+        return view if info["type"] == "text" else view.cast(info["type"])
+
+    def _text(self, name: str) -> MappedText:
+        return MappedText(self._section(name), self._section(f"{name}_offsets"))
+
+    def _postings(self, prefix: str) -> dict:
+        offsets = self._section(f"{prefix}_offsets")
+        keys = self._text(f"{prefix}_keys")
+        ids = self._section(f"{prefix}_ids")
+        return {key: ids[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+    def names_range(self, start: int, stop: int):
+        """
+        Returns (original_names, cleaned_names) of ids start..stop-1,
+        decoding only that part of the name sections (e.g. for one shard).
+        """
+        return self.original_names[start:stop], self.cleaned_names[start:stop]
+
+    @cached_property
+    def cleaned_names(self) -> MappedText:
+        return self._text("cleaned_names")
+
+    @cached_property
+    def original_names(self) -> MappedText:
+        return self._text("original_names")
+
+    @cached_property
+    def ids(self):
+        return self._section("ids")
+
+    @cached_property
+    def ngram_index(self) -> NGramIndex:
+        index = NGramIndex(n=self.header["ngram_n"])
+        index.postings = LayeredDict(self._postings("ngram"))
+        index.size = self._count
+        return index
+
+    @cached_property
+    def phonetic_index(self) -> PhoneticIndex:
+        index = PhoneticIndex()
+        index.buckets = LayeredDict(self._postings("phonetic"))
+        index.size = self._count
+        return index
+
+    @cached_property
+    def token_index(self) -> TokenIndex:
+        # Built from the mapped names; it is cheap next to the n-gram index
+        return TokenIndex(indexable_names(self.cleaned_names))
+
+    @cached_property
+    def bk_tree(self) -> BKTree:
+        # Built from the mapped names on first use, like the token index
+        return BKTree(indexable_names(self.cleaned_names))
+
+
+def open_snapshot(path: str) -> Snapshot:
+    """Opens a snapshot file without reading its sections."""
+    return Snapshot(path)
+
+
+# Command Line Build Step
+if __name__ == "__main__":
+    from corpus import NameCorpus
+    from preprocess import names_list
+
+    parser = argparse.ArgumentParser(description="Build a name corpus snapshot.")
+    parser.add_argument("--output", default="names.snap", help="snapshot file to write")
+    args = parser.parse_args()
+
+    write_snapshot(args.output, NameCorpus(names_list))
+    snapshot = open_snapshot(args.output)
+    print(f"Wrote {len(snapshot)} names to {args.output}")
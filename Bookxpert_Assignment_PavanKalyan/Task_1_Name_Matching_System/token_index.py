@@ -0,0 +1,205 @@
+# token_index.py
+"""
+This module handles:
+1. Splitting cleaned names into a given-name token and surname tokens
+2. Keeping one inverted index per role (given name / surname) and the
+   document frequency of every token
+3. Token-weighted matching: rare tokens (high IDF) count for more when the
+   candidates are ranked and scored, common ones such as "kumar" or
+   "reddy" count for less
+
+Candidates are ranked by their summed token weights over all postings of
+the query's token variants (numpy), then scored token by token, rarest
+token first; a candidate is dropped as soon as it can no longer reach the
+current top-k.
+"""
+
+# Imports
+import heapq
+import math
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+from versioned import LayeredDict
+
+
+# Minimum fuzz.ratio for a vocabulary token to stand in for a query token
+# (70 keeps one-letter variants of short tokens, e.g. "rahool" for "rahul")
+TOKEN_CUTOFF = 70
+# Vocabulary variants looked up per query token
+MAX_TOKEN_VARIANTS = 10
+# Share of its weight an extra (unmatched) name token costs the score
+EXTRA_TOKEN_PENALTY = 0.25
+# Discount for a token matched in the other role (e.g. "reddy anil")
+ROLE_SWAP_FACTOR = 0.9
+
+
+def split_name(clean_name: str):
+    """Returns (given_name, [surname tokens]) of a cleaned name."""
+    tokens = clean_name.split()
+    if not tokens:
+        return "", []
+    return tokens[0], tokens[1:]
+
+
+class TokenIndex:
+    """Per-role token inverted indexes with IDF token weights."""
+
+    def __init__(self, names=()):
+        """
+        Parameters:
+        - names (iterable of str): Cleaned names; a name's id is its position.
+        """
+        self.size = 0
+        self.postings = {"given": LayeredDict(), "surname": LayeredDict()}
+        self.doc_freq = LayeredDict()
+        self._vocab = {}
+
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str, name_id: int = None) -> int:
+        """
+        Indexes one cleaned name and returns its id.
+
+        Passing name_id re-indexes an existing id (e.g. after a rename);
+        by default the name gets the next free id.
+        """
+        if name_id is None:
+            name_id = self.size
+        given, surnames = split_name(name)
+
+        for role, tokens in (("given", [given] if given else []), ("surname", surnames)):
+            postings = self.postings[role]
+            for token in set(tokens):
+                if token not in postings:
+                    self._vocab.pop(role, None)
+                # Shared with another version of the index: copy on write
+                postings.append(token, name_id)
+
+        for token in set(name.split()):
+            self.doc_freq[token] = self.doc_freq.get(token, 0) + 1
+        self.size = max(self.size, name_id + 1)
+        return name_id
+
+    def discard(self, name: str) -> None:
+        """
+        Stops counting a removed or renamed name in the token weights.
+
+        Its ids stay in the postings; callers skip ids whose current name
+        is None or differs, as similarity.py does.
+        """
+        for token in set(name.split()):
+            self.doc_freq[token] = self.doc_freq.get(token, 0) - 1
+
+    def copy(self) -> "TokenIndex":
+        """
+        Returns a copy sharing every id list with this index; whichever of
+        the two is written to copies the lists it touches first.
+        """
+        clone = TokenIndex()
+        clone.size = self.size
+        clone.postings = {role: postings.copy() for role, postings in self.postings.items()}
+        clone.doc_freq = self.doc_freq.copy()
+        clone._vocab = dict(self._vocab)
+        return clone
+
+    def weight(self, token: str) -> float:
+        """IDF weight of a token; unseen tokens get the highest weight."""
+        return math.log((1 + self.size) / (1 + self.doc_freq.get(token, 0))) + 1
+
+    def _variants(self, token: str, role: str) -> list:
+        """Returns [(vocabulary token, similarity)] close to a query token."""
+        vocab = self._vocab.get(role)
+        if vocab is None:
+            vocab = self._vocab[role] = list(self.postings[role])
+
+        return [(t, score) for t, score, _ in process.extract(
+            token, vocab, scorer=fuzz.ratio, score_cutoff=TOKEN_CUTOFF, limit=MAX_TOKEN_VARIANTS
+        )]
+
+    def get_candidates(self, clean_input: str, max_candidates: int = 100) -> list:
+        """
+        Returns the max_candidates name ids with the highest summed
+        weight x similarity over the query's token variants.
+
+        Every posting of every variant is counted (in numpy), so the cap
+        keeps the best-scoring names instead of the first ones found.
+        """
+        tokens = clean_input.split()
+        weights = [self.weight(t) for t in tokens]
+        id_parts, score_parts = [], []
+
+        for i, token in enumerate(tokens):
+            role = "given" if i == 0 else "surname"
+            variants = self._variants(token, role)
+            if not variants:
+                role = "surname" if i == 0 else "given"
+                variants = self._variants(token, role)
+
+            for variant, similarity in variants:
+                ids = np.frombuffer(self.postings[role][variant], dtype=np.uint32)
+                id_parts.append(ids)
+                score_parts.append(np.full(len(ids), weights[i] * similarity))
+
+        if not id_parts:
+            return []
+
+        candidates, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if len(candidates) > max_candidates:
+            # Highest score first, then the lower id
+            candidates = np.sort(candidates[np.lexsort((candidates, -scores))[:max_candidates]])
+
+        return candidates.tolist()
+
+    def search(self, clean_input: str, names, limit: int = 10, max_candidates: int = 100) -> list:
+        """
+        Scores the candidates of a query token by token.
+
+        The score is the IDF-weighted mean of per-token fuzz.ratio values
+        (given name against given name, each surname against the best
+        surname), with a small penalty for extra name tokens.
+
+        Returns:
+        - List of tuples: (matched_name, similarity_score, index)
+        """
+        tokens = clean_input.split()
+        if not tokens or limit <= 0:
+            return []
+
+        weights = [self.weight(t) for t in tokens]
+        order = sorted(range(len(tokens)), key=lambda i: -weights[i])
+        total_weight = sum(weights)
+        top = []  # min-heap of (score, -index)
+
+        for name_id in self.get_candidates(clean_input, max_candidates):
+            if names[name_id] is None:  # removed name
+                continue
+            given, surnames = split_name(names[name_id])
+            extra = surnames[len(tokens) - 1:]
+            denominator = total_weight + EXTRA_TOKEN_PENALTY * sum(self.weight(t) for t in extra)
+
+            gained, remaining = 0.0, total_weight
+            for i in order:
+                remaining -= weights[i]
+                same_role = [given] if i == 0 else surnames
+                other_role = surnames if i == 0 else [given]
+                similarity = max(
+                    max((fuzz.ratio(tokens[i], t) for t in same_role), default=0),
+                    ROLE_SWAP_FACTOR * max((fuzz.ratio(tokens[i], t) for t in other_role), default=0)
+                )
+                gained += weights[i] * similarity
+
+                # Early termination: this name can no longer enter the top-k
+                if len(top) == limit and (gained + remaining * 100) / denominator < top[0][0]:
+                    break
+            else:
+                entry = (gained / denominator, -name_id)
+                if len(top) < limit:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+
+        return [(names[-neg_id], score, -neg_id) for score, neg_id in sorted(top, reverse=True)]
@@ -0,0 +1,222 @@
+# versioned.py
+"""
+This module handles:
+1. A chunked list for the corpus name lists, whose copies share its chunks
+2. A layered dict for the index postings, whose copies share its base dict
+3. Copy-on-write: a copy only copies the chunks or id arrays it writes to
+
+NameStore publishes a new corpus version for every edit (see
+name_store.py); with these containers a version costs about the same at
+10k and 1M names, instead of a copy of every name list and posting dict.
+"""
+
+# Imports
+from array import array
+from collections.abc import Mapping, Sequence
+from itertools import chain, islice
+
+
+# Items per ChunkedList chunk (a power of two)
+CHUNK_BITS = 12
+CHUNK_SIZE = 1 << CHUNK_BITS
+# Keys a LayeredDict writes next to its shared base before merging them in
+MAX_OVERLAY = 4096
+
+
+class ChunkedList(Sequence):
+    """List stored in fixed-size chunks that copies share until written."""
+
+    def __init__(self, items=()):
+        """
+        Parameters:
+        - items (iterable): Initial items.
+        """
+        self._chunks = []
+        self._len = 0
+        self._owned = None  # set by copy(): positions of chunks this copy may modify
+
+        self.extend(items)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            # Skip the chunks before start without iterating them
+            skipped = (start >> CHUNK_BITS) << CHUNK_BITS
+            items = chain.from_iterable(self._chunks[start >> CHUNK_BITS:])
+            return list(islice(items, start - skipped, max(start, stop) - skipped))
+
+        if index < 0:
+            index += self._len
+            if index < 0:
+                raise IndexError("ChunkedList index out of range")
+        return self._chunks[index >> CHUNK_BITS][index & (CHUNK_SIZE - 1)]
+
+    def __setitem__(self, index: int, value) -> None:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("ChunkedList assignment index out of range")
+        self._writable(index >> CHUNK_BITS)[index & (CHUNK_SIZE - 1)] = value
+
+    def _writable(self, position: int) -> list:
+        """Returns a chunk, or a private copy of it if it is shared with another list."""
+        chunk = self._chunks[position]
+        if self._owned is None or position in self._owned:
+            return chunk
+        chunk = self._chunks[position] = list(chunk)
+        self._owned.add(position)
+        return chunk
+
+    def append(self, item) -> None:
+        self.extend([item])
+
+    def extend(self, items) -> None:
+        items = list(items)
+        done = 0
+        while done < len(items):
+            if not self._chunks or len(self._chunks[-1]) == CHUNK_SIZE:
+                self._chunks.append([])
+                if self._owned is not None:
+                    self._owned.add(len(self._chunks) - 1)
+
+            chunk = self._writable(len(self._chunks) - 1)
+            part = items[done:done + CHUNK_SIZE - len(chunk)]
+            chunk.extend(part)
+            done += len(part)
+
+        self._len += len(items)
+
+    def copy(self) -> "ChunkedList":
+        """
+        Returns a copy sharing every chunk with this list; whichever of
+        the two is written to copies the chunks it touches first.
+        """
+        clone = ChunkedList()
+        clone._chunks = list(self._chunks)
+        clone._len = self._len
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+
+class LayeredDict(Mapping):
+    """
+    Dict whose copies share one base dict.
+
+    Once the base is shared, writes go to a small overlay dict; past
+    MAX_OVERLAY keys the overlay is merged into a new base (other copies
+    keep the old one), so a lookup checks at most two dicts.
+    """
+
+    def __init__(self, base: dict = None):
+        """
+        Parameters:
+        - base (dict): Initial contents, used without copying and never
+          written to (e.g. id lists mapped from a snapshot).
+        """
+        self._base = base if base is not None else {}
+        self._overlay = {}
+        self._base_shared = base is not None
+        # Keys whose id arrays this copy may modify; None: all of them
+        self._owned = None if base is None else set()
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        return self._base[key]
+
+    def get(self, key, default=None):
+        if key in self._overlay:
+            return self._overlay[key]
+        return self._base.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._overlay or key in self._base
+
+    def __iter__(self):
+        # Base keys first, then the keys added since the last merge
+        return chain(self._base, (key for key in self._overlay if key not in self._base))
+
+    def __len__(self):
+        return len(self._base) + sum(1 for key in self._overlay if key not in self._base)
+
+    def __setitem__(self, key, value) -> None:
+        if not self._base_shared:
+            self._base[key] = value
+            return
+
+        self._overlay[key] = value
+        if len(self._overlay) > MAX_OVERLAY:
+            self._base = {**self._base, **self._overlay}
+            self._overlay = {}
+            self._base_shared = False
+
+    def append(self, key, name_id: int) -> None:
+        """
+        Appends a name id to the id array at key (created if missing).
+        An array shared with another copy, or mapped from a snapshot, is
+        copied first.
+        """
+        if self._owned is None:
+            # Never copied: every array belongs to this dict (index builds)
+            ids = self._base.get(key)
+            if ids is None:
+                ids = self._base[key] = array("I")
+            ids.append(name_id)
+            return
+
+        ids = self.get(key)
+        if ids is None:
+            ids = array("I")
+        elif self._owned is None or key in self._owned:
+            ids.append(name_id)
+            return
+        else:
+            ids = array("I", ids)
+
+        self[key] = ids
+        if self._owned is not None:
+            self._owned.add(key)
+        ids.append(name_id)
+
+    def discard(self, key, name_id: int) -> None:
+        """
+        Removes a name id from the id array at key, if it is there. An
+        array shared with another copy, or mapped from a snapshot, is
+        copied first.
+        """
+        ids = self.get(key)
+        if ids is None:
+            return
+        owned = self._owned is None or key in self._owned
+        if not owned:
+            ids = array("I", ids)
+        if name_id not in ids:
+            return
+
+        ids.remove(name_id)
+        if not owned:
+            self[key] = ids
+            self._owned.add(key)
+
+    def copy(self) -> "LayeredDict":
+        """
+        Returns a copy sharing the base dict and every value with this
+        one; whichever of the two is written to copies the id arrays it
+        touches first.
+        """
+        clone = LayeredDict()
+        clone._base = self._base
+        clone._overlay = dict(self._overlay)
+        clone._base_shared = self._base_shared = True
+        clone._owned = set()
+        self._owned = set()
+        return clone
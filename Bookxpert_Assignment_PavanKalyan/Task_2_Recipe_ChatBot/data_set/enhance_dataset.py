@@ -1,37 +1,55 @@
+import argparse
 import json
+import os
 import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
-def load_existing_recipes(input_path: str) -> List[Dict[str, str]]:
-    """Load existing recipes from JSONL file."""
-    recipes = []
+DATA_DIR = Path(__file__).resolve().parent
+DEFAULT_INPUT_PATH = DATA_DIR / "recipes_finetune.jsonl"
+DEFAULT_OUTPUT_DIR = DATA_DIR / "recipes_enhanced_shards"
+MANIFEST_NAME = "manifest.json"
+
+# (shard number, line number of its first input line, raw input lines)
+Chunk = Tuple[int, int, List[str]]
+
+def read_chunks(input_path, shard_size: int) -> Iterator[Chunk]:
+    """Stream the input file as chunks of shard_size lines (one chunk per output shard)."""
     with open(input_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                recipes.append(json.loads(line.strip()))
-            except json.JSONDecodeError:
-                continue
-    return recipes
+        shard = 0
+        while True:
+            lines = list(islice(f, shard_size))
+            if not lines:
+                return
+            yield shard, shard * shard_size, lines
+            shard += 1
 
-def generate_enhanced_recipe(base_recipe: Dict[str, str]) -> Dict[str, str]:
-    """Enhance a single recipe with more details."""
+def shard_path(output_dir, shard: int) -> Path:
+    return Path(output_dir) / f"part-{shard:05d}.jsonl"
+
+def generate_enhanced_recipe(base_recipe: Dict[str, str], rng: Optional[random.Random] = None) -> Dict[str, str]:
+    """Enhance a single recipe with more details (random choices come from rng)."""
+    rng = rng or random
     ingredients = [i.strip() for i in base_recipe['input'].split(',')]
     
     # Recipe templates for different cuisines
     cuisines = ["Indian", "Italian", "Chinese", "Mexican", "Mediterranean"]
-    cuisine = random.choice(cuisines)
+    cuisine = rng.choice(cuisines)
     
     # Generate detailed recipe
     recipe = {
         "instruction": "Create a detailed recipe with the given ingredients. Include title, ingredients with quantities, step-by-step instructions, cooking time, and number of servings.",
         "input": ", ".join(ingredients),
-        "output": generate_recipe_output(ingredients, cuisine)
+        "output": generate_recipe_output(ingredients, cuisine, rng)
     }
     return recipe
 
-def generate_recipe_output(ingredients: List[str], cuisine: str) -> str:
+def generate_recipe_output(ingredients: List[str], cuisine: str, rng: Optional[random.Random] = None) -> str:
     """Generate detailed recipe output."""
+    rng = rng or random
     # Common recipe components
     proteins = ["chicken", "paneer", "tofu", "fish", "egg", "dal", "beans"]
     veggies = ["onion", "tomato", "potato", "carrot", "beans", "peas", "spinach"]
@@ -97,28 +115,106 @@ Ingredients:
 Instructions:
 """ + "\n".join(f"{i+1}. {step}" for i, step in enumerate(instructions)) + f"""
 
-Time: {random.randint(15, 45)} minutes
-Servings: {random.randint(2, 4)}
+Time: {rng.randint(15, 45)} minutes
+Servings: {rng.randint(2, 4)}
 Cuisine: {cuisine}
-Dietary Info: {"Vegetarian" if not has_protein else "Non-vegetarian"}, {random.choice(["Gluten-free", "Nut-free", "Dairy-free"])}"""
+Dietary Info: {"Vegetarian" if not has_protein else "Non-vegetarian"}, {rng.choice(["Gluten-free", "Nut-free", "Dairy-free"])}"""
 
-def main():
-    input_path = Path("D:/Bookxpert_Assignment_PavanKalyan/Task_2_Recipe_ChatBot/data_set/recipes_finetune.jsonl")
-    output_path = Path("D:/Bookxpert_Assignment_PavanKalyan/Task_2_Recipe_ChatBot/data_set/recipes_enhanced.jsonl")
+def enhance_chunk(chunk: Chunk, output_dir: str, seed: int) -> int:
+    """
+    Enhance one chunk and commit it as its shard: written to a temporary file
+    and renamed, so a shard file either is complete or does not exist.
+
+    Every record gets its own generator seeded with (seed, line number), so the
+    output does not depend on the chunking or the number of workers.
+    """
+    shard, first_line, lines = chunk
+    path = shard_path(output_dir, shard)
+    tmp_path = path.with_name(path.name + ".tmp")
     
-    # Load existing recipes
-    print("Loading existing recipes...")
-    existing_recipes = load_existing_recipes(input_path)
+    count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line_number, line in enumerate(lines, first_line):
+            try:
+                base_recipe = json.loads(line.strip())
+            except json.JSONDecodeError:
+                continue
+            rng = random.Random(f"{seed}:{line_number}")
+            f.write(json.dumps(generate_enhanced_recipe(base_recipe, rng), ensure_ascii=False) + '\n')
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def check_manifest(output_dir: Path, settings: Dict[str, Any]) -> None:
+    """Record the run settings; resuming with different ones would mix incompatible shards."""
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous != settings:
+            raise SystemExit(f"{output_dir} was written with {previous}; use the same settings or another --output-dir")
+        return
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=2)
+
+def enhance_dataset(input_path, output_dir, shard_size: int = 10000,
+                    workers: Optional[int] = None, seed: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    Enhance input_path into output_dir/part-NNNNN.jsonl, yielding (shard, records)
+    as shards are committed.
+
+    Chunks are enhanced in a process pool with at most two chunks per worker
+    in flight, so memory does not grow with the input. Shards that already
+    exist (from a run that crashed) are skipped.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    check_manifest(output_dir, {"input": str(Path(input_path).resolve()), "shard_size": shard_size, "seed": seed})
+    
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in read_chunks(input_path, shard_size):
+            if shard_path(output_dir, chunk[0]).exists():
+                continue
+            pending.append((chunk[0], executor.submit(enhance_chunk, chunk, str(output_dir), seed)))
+            if len(pending) >= 2 * workers:
+                shard, future = pending.popleft()
+                yield shard, future.result()
+        while pending:
+            shard, future = pending.popleft()
+            yield shard, future.result()
+
+def merge_shards(output_dir, merged_path) -> int:
+    """Concatenate the shards, in order, into one JSONL file (e.g. recipes_enhanced.jsonl)."""
+    count = 0
+    with open(merged_path, 'w', encoding='utf-8') as out:
+        for path in sorted(Path(output_dir).glob("part-*.jsonl")):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    out.write(line)
+                    count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Enhance a JSONL recipe dataset into sharded JSONL files.")
+    parser.add_argument("--input", default=str(DEFAULT_INPUT_PATH), help="JSONL recipes with an \"input\" ingredient list")
+    parser.add_argument("--output-dir", default=str(DEFAULT_OUTPUT_DIR), help="directory of the output shards")
+    parser.add_argument("--shard-size", type=int, default=10000, help="input lines per shard")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the per-record random choices")
+    parser.add_argument("--merged", help="also concatenate the shards into this JSONL file when done")
+    args = parser.parse_args()
     
-    # Generate enhanced recipes
-    print(f"Enhancing {len(existing_recipes)} recipes...")
-    enhanced_recipes = [generate_enhanced_recipe(r) for r in existing_recipes]
+    print(f"Enhancing recipes from {args.input} into {args.output_dir}...")
+    total = 0
+    for shard, count in enhance_dataset(args.input, args.output_dir, args.shard_size, args.workers, args.seed):
+        total += count
+        print(f"Committed shard {shard:05d} ({count} recipes)")
+    print(f"Enhanced {total} recipes")
     
-    # Save enhanced recipes
-    print(f"Saving {len(enhanced_recipes)} enhanced recipes to {output_path}")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for recipe in enhanced_recipes:
-            f.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+    if args.merged:
+        print(f"Saved {merge_shards(args.output_dir, args.merged)} enhanced recipes to {args.merged}")
     
     print("Dataset enhancement complete!")
 
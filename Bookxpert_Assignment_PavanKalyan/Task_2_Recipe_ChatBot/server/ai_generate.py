@@ -1,22 +1,253 @@
-from transformers import pipeline
+from transformers import pipeline, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from transformers.pytorch_utils import Conv1D
+from collections import OrderedDict
+from pathlib import Path
+import copy
 import torch
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import random
 import re
+import time
+from metrics import Trace
 
 logger = logging.getLogger(__name__)
 
+MODEL_CACHE_DIR = str(Path(__file__).resolve().parent / "model_cache")
+
+# Prompts are split after this text: the part before it only depends on the
+# difficulty and category, so its key/value state is computed once and reused
+PROMPT_PREFIX_END = "using these ingredients:"
+DIFFICULTIES = [None, "easy", "medium", "hard"]
+
+# Prompt + generated tokens, as in the original generate call; with
+# adaptive_length it is only a safety ceiling and generation normally ends
+# when RecipeStoppingCriteria finds the recipe complete
+MAX_LENGTH = 1000
+
+# A line of the instructions "stays on topic" if it is a step or mentions one of these
+COOKING_WORDS = (
+    "add", "bake", "boil", "bowl", "chop", "combine", "cook", "cut", "dice", "fry", "grill",
+    "heat", "minute", "mix", "oil", "oven", "pan", "pepper", "place", "pour", "remove", "roast",
+    "salt", "sauce", "season", "serve", "simmer", "slice", "stir", "taste", "water", "whisk"
+)
+# Consecutive off-topic instruction lines before the text counts as drifting
+MAX_OFF_TOPIC_LINES = 3
+
+def quantize_for_cpu(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Dynamic int8 quantization of GPT-2 for CPU inference (in place).
+
+    GPT-2's attention and MLP projections are transformers Conv1D modules,
+    which quantize_dynamic does not handle, so they are first replaced by
+    the equivalent nn.Linear layers (Conv1D stores the weight transposed).
+    """
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+class FallbackRecipe(str):
+    """The generic recipe returned when generation fails; callers must not cache or share it"""
+
+class CancelCriteria(StoppingCriteria):
+    """Stops a sequence of the batch at the next token once its event is set (e.g. the client left)"""
+    def __init__(self, cancel_events: List[Optional[threading.Event]]):
+        self.cancel_events = cancel_events
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        cancelled = [event is not None and event.is_set() for event in self.cancel_events]
+        return torch.tensor(cancelled, dtype=torch.bool, device=input_ids.device)
+
+class RecipeStoppingCriteria(StoppingCriteria):
+    """
+    Stops each sequence of the batch once the rest of it would be thrown away
+    by _format_recipe:
+    - its token budget (a safety ceiling) is used up
+    - the title, Ingredients and Instructions are complete (the Instructions
+      section ended because another one started)
+    - a line repeats an earlier one
+    - the instructions drift off topic (MAX_OFF_TOPIC_LINES lines in a row
+      that are not numbered steps and mention no ingredient or cooking word)
+
+    Every sequence is parsed like _format_recipe parses it: the prompt first,
+    then each new token as it is generated.
+    """
+    def __init__(self, jobs: List[Dict[str, Any]], budgets: List[int], prompt_length: int, decode):
+        """
+        jobs: _build_prompt results, one per sequence
+        budgets: new tokens allowed per sequence
+        prompt_length: prompt tokens of the batch (padding included)
+        decode: token id -> text
+        """
+        self.budgets = budgets
+        self.prompt_length = prompt_length
+        self.decode = decode
+        self.done = [False] * len(jobs)
+        self.stop_reasons: List[Optional[str]] = [None] * len(jobs)
+        self._rows = []
+        for job in jobs:
+            parser = RecipeSectionParser(job["difficulty"])
+            parser.feed(job["prompt"])
+            keywords = tuple(word for ing in job["ingredient_list"] for word in ing.lower().split()) + COOKING_WORDS
+            self._rows.append({"parser": parser, "line": job["prompt"].rsplit('\n', 1)[-1], "seen": set(),
+                               "off_topic": 0, "keywords": keywords})
+        self._length = prompt_length
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        new_ids = input_ids[:, self._length:].tolist()
+        self._length = input_ids.shape[1]
+        generated = self._length - self.prompt_length
+        
+        for i, row in enumerate(self._rows):
+            if self.done[i]:
+                continue
+            reason = self._feed(row, self.decode(new_ids[i]))
+            if reason is None and generated >= self.budgets[i]:
+                reason = "budget"
+            if reason is not None:
+                self.done[i] = True
+                self.stop_reasons[i] = reason
+        
+        return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
+    def _feed(self, row: Dict[str, Any], text: str) -> Optional[str]:
+        """Parse new text of one sequence; the reason to stop, if any"""
+        parser = row["parser"]
+        events = parser.feed(text)
+        *lines, row["line"] = (row["line"] + text).split('\n')
+        
+        sections = parser.sections
+        for kind, name in events:
+            if (kind, name) == ("section", "Instructions") and parser.title and sections["Ingredients"] and sections["Instructions"]:
+                return "complete"
+        
+        for line in lines:
+            line = " ".join(line.lower().split())
+            if len(line) < 4:
+                continue
+            if line in row["seen"]:
+                return "repetition"
+            row["seen"].add(line)
+            
+            if parser.current_section == "Instructions" and sections["Instructions"]:
+                on_topic = line[0].isdigit() or line[0] in "-*•" or any(word in line for word in row["keywords"])
+                row["off_topic"] = 0 if on_topic else row["off_topic"] + 1
+                if row["off_topic"] >= MAX_OFF_TOPIC_LINES:
+                    return "drift"
+        return None
+
+class RecipeSectionParser:
+    """
+    Incremental version of the section parsing in _format_recipe.
+
+    Text can be fed in arbitrary chunks (e.g. streamed tokens); only complete
+    lines are parsed. feed() and close() return what was completed by the new
+    text: ("title", title) once the title line is known and ("section", name)
+    when a section ends because the next one starts (or the text ends).
+    """
+    def __init__(self, difficulty: Optional[str] = None):
+        self.sections = {
+            "Description": "",
+            "Ingredients": "",
+            "Instructions": "",
+            "Prep Time": "15 minutes",
+            "Cook Time": "30 minutes",
+            "Servings": "2-4",
+            "Difficulty": difficulty.capitalize() if difficulty else "Medium"
+        }
+        self.title: Optional[str] = None
+        self.current_section: Optional[str] = None
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        events = []
+        for line in lines:
+            events.extend(self._parse_line(line))
+        return events
+
+    def close(self) -> List[Tuple[str, str]]:
+        """Parse the last (unterminated) line and end the current section"""
+        events = self._parse_line(self._buffer)
+        self._buffer = ""
+        if self.current_section:
+            events.append(("section", self.current_section))
+            self.current_section = None
+        return events
+
+    def _parse_line(self, line: str) -> List[Tuple[str, str]]:
+        events = []
+        
+        # The title is the first non-empty line without a colon
+        if self.title is None and line.strip() and ":" not in line:
+            self.title = line.strip()
+            events.append(("title", self.title))
+        
+        line_lower = line.lower().strip()
+        
+        if "ingredient" in line_lower:
+            section = "Ingredients"
+        elif "instruction" in line_lower or "direction" in line_lower:
+            section = "Instructions"
+        elif "time" in line_lower:
+            section = "Cook Time"
+        elif "serving" in line_lower:
+            section = "Servings"
+        elif "description" in line_lower:
+            section = "Description"
+        elif "difficulty" in line_lower:
+            section = "Difficulty"
+        else:
+            section = None
+        
+        if section:
+            if self.current_section and self.current_section != section:
+                events.append(("section", self.current_section))
+            self.current_section = section
+            return events
+            
+        if self.current_section and self.current_section in self.sections:
+            if not self.sections[self.current_section]:
+                self.sections[self.current_section] = line.strip()
+            else:
+                self.sections[self.current_section] += "\n" + line.strip()
+        return events
+
 class RecipeGenerator:
-    def __init__(self):
+    def __init__(self, quantize: bool = False, num_threads: Optional[int] = None,
+                 prefix_cache_size: int = 32, adaptive_length: bool = True):
+        """
+        quantize: run a dynamically int8-quantized copy of the model (CPU only)
+        num_threads: torch threads used by this process (default: torch's own)
+        prefix_cache_size: prompt prefixes whose key/value state is kept (0 disables it)
+        adaptive_length: stop each sequence once the recipe is complete (see
+                         RecipeStoppingCriteria), instead of always generating up to
+                         MAX_LENGTH tokens
+        """
         try:
             logger.info("Initializing Recipe Generator...")
-            self.generator = pipeline(
-                'text-generation', 
-                model='gpt2',
-                device=0 if torch.cuda.is_available() else -1,
-                model_kwargs={"cache_dir": "./model_cache"}
-            )
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            
+            self.adaptive_length = adaptive_length
+            self._load_model(quantize)
+            self._tokenizer_lock = threading.Lock()
+            
+            # Prompt prefix -> (token ids, past_key_values), least recently used first
+            self.prefix_cache_size = prefix_cache_size
+            self._prefix_cache = OrderedDict()
+            self._prefix_lock = threading.Lock()
+            
             logger.info("Recipe Generator initialized successfully")
             
             self.culinary_terms = {
@@ -71,6 +302,49 @@ class RecipeGenerator:
         except:
             return False
 
+    def _load_model(self, quantize: bool) -> None:
+        """Load GPT-2 into self.generator (overridden by stand-ins that need no model)"""
+        use_cuda = torch.cuda.is_available()
+        self.generator = pipeline(
+            'text-generation', 
+            model='gpt2',
+            device=0 if use_cuda else -1,
+            model_kwargs={"cache_dir": MODEL_CACHE_DIR}
+        )
+        
+        self.quantized = False
+        if quantize:
+            self.quantize()
+        
+        # Batched generation: GPT-2 has no pad token, and decoder-only
+        # models must be padded on the left
+        self.generator.tokenizer.pad_token = self.generator.tokenizer.eos_token
+        self.generator.tokenizer.padding_side = "left"
+
+    def quantize(self) -> None:
+        """
+        Switch to the dynamically int8-quantized model (CPU only). This runs
+        torch ops, so a server that forks after loading the model quantizes
+        in each worker process instead of before the fork.
+        """
+        if self.quantized:
+            return
+        if torch.cuda.is_available():
+            logger.warning("Quantized inference is CPU only; using the full-precision model on the GPU")
+            return
+        self.generator.model = quantize_for_cpu(self.generator.model)
+        self.quantized = True
+        logger.info("Using the int8-quantized model")
+
+    def warm_up(self) -> None:
+        """
+        Compute the prefix cache entries of the prompts without a category.
+        This runs the model, so a server that forks after loading it calls
+        warm_up in each worker process instead of before the fork.
+        """
+        for difficulty in DIFFICULTIES[:self.prefix_cache_size]:
+            self._prefix_state(self._build_prompt("egg", difficulty=difficulty)["prefix"])
+
     def _validate_parameters(self, ingredients: str, cooking_time: Optional[int], difficulty: Optional[str]) -> None:
         """Validate input parameters"""
         if not ingredients or not isinstance(ingredients, str):
@@ -155,119 +429,402 @@ class RecipeGenerator:
         return "This recipe uses standard cooking techniques suitable for most home cooks."
 
     def generate_recipe(self, ingredients: str, category: Optional[str] = None, 
-                       cooking_time: Optional[int] = None, difficulty: Optional[str] = None) -> str:
+                       cooking_time: Optional[int] = None, difficulty: Optional[str] = None,
+                       cancel_event: Optional[threading.Event] = None, trace: Optional[Trace] = None) -> str:
+        request = {
+            "ingredients": ingredients,
+            "category": category,
+            "cooking_time": cooking_time,
+            "difficulty": difficulty
+        }
+        return self.generate_recipes([request], [cancel_event], [trace])[0]
+
+    def generate_recipes(self, requests: List[Dict[str, Any]],
+                         cancel_events: Optional[List[Optional[threading.Event]]] = None,
+                         traces: Optional[List[Optional[Trace]]] = None) -> List[str]:
+        """
+        Generate one recipe per request (generate_recipe keyword arguments) in a single batched model call.
+        Stage durations and token counts are recorded in traces; batch-wide stages count for every request.
+        """
+        cancel_events = cancel_events or [None] * len(requests)
+        traces = [trace or Trace() for trace in (traces or [None] * len(requests))]
+        recipes: List[Optional[str]] = [None] * len(requests)
+        jobs = []
+        
+        for i, request in enumerate(requests):
+            try:
+                with traces[i].stage("prompt"):
+                    job = self._build_prompt(**request)
+            except Exception as e:
+                logger.error(f"Error generating recipe: {str(e)}")
+                job = None
+            if job is None:
+                recipes[i] = self._get_fallback_recipe(request.get("ingredients"))
+            else:
+                jobs.append((i, job))
+        
+        if jobs:
+            try:
+                texts = self._sample([job for _, job in jobs], [cancel_events[i] for i, _ in jobs],
+                                     [traces[i] for i, _ in jobs])
+            except Exception as e:
+                logger.error(f"Error generating recipe: {str(e)}")
+                texts = [None] * len(jobs)
+            
+            for (i, job), text in zip(jobs, texts):
+                recipes[i] = self._postprocess(text, job, traces[i]) if text is not None else self._get_fallback_recipe(job["ingredients"])
+        
+        return recipes
+
+    def stream_recipe(self, ingredients: str, category: Optional[str] = None,
+                      cooking_time: Optional[int] = None, difficulty: Optional[str] = None,
+                      cancel_event: Optional[threading.Event] = None,
+                      trace: Optional[Trace] = None,
+                      slot: Optional[threading.Semaphore] = None) -> Iterator[Dict[str, str]]:
+        """
+        Generate a recipe and yield events while it is decoded:
+        - {"event": "token", "text": ...} for every decoded piece of text
+        - {"event": "title" / "section", ...} with the formatted block as soon as
+          the title, Ingredients or Instructions are complete
+        - {"event": "recipe", "recipe": ...} with the full recipe, as generate_recipe returns it
+        
+        The model only starts once it holds slot (e.g. BatchScheduler.slots),
+        so streams share the generation workers with the batched requests.
+        """
+        trace = trace or Trace()
         try:
-            # Validate inputs
-            self._validate_parameters(ingredients, cooking_time, difficulty)
+            with trace.stage("prompt"):
+                job = self._build_prompt(ingredients, category, cooking_time, difficulty)
+        except Exception as e:
+            logger.error(f"Error generating recipe: {str(e)}")
+            job = None
+        if job is None:
+            yield {"event": "recipe", "recipe": self._get_fallback_recipe(ingredients)}
+            return
+        
+        tokenizer = self.generator.tokenizer
+        model = self.generator.model
+        cancel_event = cancel_event or threading.Event()
+        
+        with trace.stage("tokenize"):
+            inputs = self._model_inputs([job])
+        generate_kwargs = self._generate_kwargs([job], inputs, [cancel_event])
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        outputs = []
+        
+        def run():
+            if slot is not None:
+                with trace.stage("queue"):
+                    while not slot.acquire(timeout=0.1):
+                        if cancel_event.is_set():
+                            streamer.end()
+                            return
+            try:
+                with torch.no_grad(), trace.stage("generate"):
+                    outputs.append(model.generate(
+                        **inputs,
+                        temperature=0.9,
+                        do_sample=True,
+                        top_p=0.95,
+                        pad_token_id=tokenizer.pad_token_id,
+                        no_repeat_ngram_size=2,
+                        streamer=streamer,
+                        **generate_kwargs
+                    ))
+            except Exception as e:
+                logger.error(f"Error generating recipe: {str(e)}")
+                streamer.end()
+            finally:
+                if slot is not None:
+                    slot.release()
+        
+        thread = threading.Thread(target=run, name="recipe-stream", daemon=True)
+        thread.start()
+        
+        parser = RecipeSectionParser(difficulty)
+        sent: Dict[str, str] = {}
+        recipe = job["prompt"]
+        try:
+            for event in parser.feed(recipe):
+                yield from self._stream_block(event, parser, job, sent)
+            for text in streamer:
+                recipe += text
+                yield {"event": "token", "text": text}
+                for event in parser.feed(text):
+                    yield from self._stream_block(event, parser, job, sent)
             
-            # Clean and process ingredients
-            ingredient_list = [i.strip() for i in ingredients.split(',') if i.strip()]
-            if not ingredient_list:
-                return self._get_fallback_recipe(ingredients)
-                
-            enhanced_ingredients = self._enhance_ingredients(ingredient_list)
+            # Blocks the text never completed get their defaults, as in _format_recipe
+            for event in parser.close() + [("title", parser.title or "Delicious Recipe"),
+                                           ("section", "Ingredients"), ("section", "Instructions")]:
+                yield from self._stream_block(event, parser, job, sent)
+        finally:
+            # Also stops the model when the consumer goes away mid-stream
+            cancel_event.set()
+        
+        thread.join()
+        if not outputs:
+            # The model failed (or never started), as a None text in generate_recipes
+            yield {"event": "recipe", "recipe": self._get_fallback_recipe(job["ingredients"])}
+            return
+        self._record_tokens([trace], inputs, outputs[0], generate_kwargs)
+        yield {"event": "recipe", "recipe": self._postprocess(recipe, job, trace)}
+
+    def _stream_block(self, event: Tuple[str, str], parser: RecipeSectionParser,
+                      job: Dict[str, Any], sent: Dict[str, str]) -> Iterator[Dict[str, str]]:
+        """
+        The formatted title / Ingredients / Instructions block for a parser event.
+        A section the text returns to later is sent again; clients replace it by name.
+        """
+        kind, name = event
+        if kind == "title":
+            name = "Title"
+        if name not in ("Title", "Ingredients", "Instructions"):
+            return
+        
+        if name == "Title":
+            text = f"# {parser.title or 'Delicious Recipe'}"
+        elif name == "Ingredients":
+            text = self._format_ingredients(parser.sections, job["ingredient_list"], job["enhanced_ingredients"])
+        else:
+            text = self._format_instructions(parser.sections)
+        
+        if sent.get(name) != text:
+            sent[name] = text
+            yield {"event": kind, "name": name, "text": text}
+
+    def _build_prompt(self, ingredients: str, category: Optional[str] = None,
+                      cooking_time: Optional[int] = None, difficulty: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Validate a request and build its prompt; None if no ingredients are left"""
+        # Validate inputs
+        self._validate_parameters(ingredients, cooking_time, difficulty)
+        
+        # Clean and process ingredients
+        ingredient_list = [i.strip() for i in ingredients.split(',') if i.strip()]
+        if not ingredient_list:
+            return None
             
-            # Build prompt with all parameters
-            prompt_parts = [f"Create a{' ' + difficulty if difficulty else ''} recipe in English only"]
+        enhanced_ingredients = self._enhance_ingredients(ingredient_list)
+        
+        # Build prompt with all parameters
+        prompt_parts = [f"Create a{' ' + difficulty if difficulty else ''} recipe in English only"]
+        
+        if category and category.lower() != 'all':
+            prompt_parts.append(f"for {category.lower()}")
             
-            if category and category.lower() != 'all':
-                prompt_parts.append(f"for {category.lower()}")
-                
-            prompt_parts.append(f"using these ingredients: {', '.join(ingredient_list)}")
+        prompt_parts.append(f"using these ingredients: {', '.join(ingredient_list)}")
+        
+        if cooking_time:
+            prompt_parts.append(f"that takes no more than {cooking_time} minutes to prepare and cook")
+            
+        prompt = " ".join(prompt_parts) + "\n\nRespond in English only.\n\nTitle: "
+        
+        return {
+            "prompt": prompt,
+            "prefix": prompt[:prompt.index(PROMPT_PREFIX_END) + len(PROMPT_PREFIX_END)],
+            "ingredients": ingredients,
+            "ingredient_list": ingredient_list,
+            "enhanced_ingredients": enhanced_ingredients,
+            "difficulty": difficulty
+        }
+
+    def _prefix_state(self, prefix: str):
+        """Token ids and past_key_values of a prompt prefix, computed on first use"""
+        with self._prefix_lock:
+            state = self._prefix_cache.get(prefix)
+            if state is not None:
+                self._prefix_cache.move_to_end(prefix)
+                return state
             
-            if cooking_time:
-                prompt_parts.append(f"that takes no more than {cooking_time} minutes to prepare and cook")
-                
-            prompt = " ".join(prompt_parts) + "\n\nRespond in English only.\n\nTitle: "
+            model = self.generator.model
+            with self._tokenizer_lock:
+                prefix_ids = self.generator.tokenizer(prefix, return_tensors="pt").input_ids.to(model.device)
+            with torch.no_grad():
+                past_key_values = model(prefix_ids, use_cache=True).past_key_values
             
-            result = self.generator(
-                prompt,
-                max_length=1000,
-                num_return_sequences=1,
+            state = self._prefix_cache[prefix] = (prefix_ids, past_key_values)
+            while len(self._prefix_cache) > self.prefix_cache_size:
+                self._prefix_cache.popitem(last=False)
+            return state
+
+    def _model_inputs(self, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        model.generate inputs for a batch of prompts.
+
+        When all prompts share one prefix, decoding starts from the cached
+        prefix state and only the tails are encoded: the input is
+        [prefix | left-padded tail], and each request gets its own copy of the
+        cache because generate extends it in place. Otherwise the whole
+        prompts are left-padded.
+        """
+        tokenizer = self.generator.tokenizer
+        model = self.generator.model
+        prefix = jobs[0]["prefix"]
+        
+        if not self.prefix_cache_size or any(job["prefix"] != prefix for job in jobs):
+            # Fast tokenizers must not be used from two threads at once
+            with self._tokenizer_lock:
+                return dict(tokenizer([job["prompt"] for job in jobs], return_tensors="pt", padding=True).to(model.device))
+        
+        prefix_ids, past_key_values = self._prefix_state(prefix)
+        with self._tokenizer_lock:
+            # The tails start with a space, which GPT-2 keeps on the next word's token,
+            # so prefix + tail tokenize exactly like the whole prompt
+            tails = tokenizer([job["prompt"][len(prefix):] for job in jobs], return_tensors="pt", padding=True).to(model.device)
+        
+        batch_size = len(jobs)
+        past_key_values = copy.deepcopy(past_key_values)
+        if batch_size > 1:
+            if isinstance(past_key_values, tuple):
+                past_key_values = tuple(tuple(t.repeat(batch_size, 1, 1, 1) for t in layer) for layer in past_key_values)
+            else:
+                past_key_values.batch_repeat_interleave(batch_size)
+        
+        return {
+            "input_ids": torch.cat([prefix_ids.repeat(batch_size, 1), tails["input_ids"]], dim=1),
+            "attention_mask": torch.cat([torch.ones_like(prefix_ids).repeat(batch_size, 1), tails["attention_mask"]], dim=1),
+            "past_key_values": past_key_values
+        }
+
+    def _decode_tokens(self, token_ids: List[int]) -> str:
+        with self._tokenizer_lock:
+            return self.generator.tokenizer.decode(token_ids, skip_special_tokens=True)
+
+    def _generate_kwargs(self, jobs: List[Dict[str, Any]], inputs: Dict[str, Any],
+                         cancel_events: List[Optional[threading.Event]]) -> Dict[str, Any]:
+        """Length and stopping arguments of model.generate for a batch"""
+        criteria = []
+        if any(cancel_events):
+            criteria.append(CancelCriteria(cancel_events))
+        
+        if not self.adaptive_length:
+            return {"max_length": MAX_LENGTH, "stopping_criteria": StoppingCriteriaList(criteria) if criteria else None}
+        
+        # The same ceiling as the fixed-length generate call; the stopping
+        # criteria end each recipe once it is complete
+        prompt_length = inputs["input_ids"].shape[1]
+        budget = MAX_LENGTH - prompt_length
+        criteria.append(RecipeStoppingCriteria(jobs, [budget] * len(jobs), prompt_length, self._decode_tokens))
+        return {"max_new_tokens": budget, "stopping_criteria": StoppingCriteriaList(criteria)}
+
+    def _sample(self, jobs: List[Dict[str, Any]], cancel_events: List[Optional[threading.Event]],
+                traces: List[Trace]) -> List[str]:
+        """Sample one continuation per prompt in one batch"""
+        tokenizer = self.generator.tokenizer
+        model = self.generator.model
+        
+        start = time.perf_counter()
+        inputs = self._model_inputs(jobs)
+        generate_kwargs = self._generate_kwargs(jobs, inputs, cancel_events)
+        tokenized = time.perf_counter()
+        
+        with torch.no_grad():
+            output = model.generate(
+                **inputs,
                 temperature=0.9,
                 do_sample=True,
                 top_p=0.95,
-                pad_token_id=50256,
+                pad_token_id=tokenizer.pad_token_id,
                 no_repeat_ngram_size=2,
-                early_stopping=True
+                **generate_kwargs
             )
-            
-            recipe = result[0]['generated_text']
-            
+        generated = time.perf_counter()
+        
+        with self._tokenizer_lock:
+            texts = tokenizer.batch_decode(output, skip_special_tokens=True)
+        
+        for trace in traces:
+            trace.add("tokenize", tokenized - start)
+            trace.add("generate", generated - tokenized)
+            trace.add("decode", time.perf_counter() - generated)
+        self._record_tokens(traces, inputs, output, generate_kwargs)
+        return texts
+
+    def _record_tokens(self, traces: List[Trace], inputs: Dict[str, Any], output: torch.LongTensor,
+                       generate_kwargs: Dict[str, Any]) -> None:
+        """Prompt/output token counts, decoding speed and stop reason of each sequence"""
+        # GPT-2 pads with its end-of-text token, so padding and the end token are not counted
+        prompt_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+        output_tokens = (output[:, inputs["input_ids"].shape[1]:] != self.generator.tokenizer.pad_token_id).sum(dim=1).tolist()
+        criteria = [c for c in generate_kwargs["stopping_criteria"] or [] if isinstance(c, RecipeStoppingCriteria)]
+        
+        for i, trace in enumerate(traces):
+            trace.values["prompt_tokens"] = prompt_tokens[i]
+            trace.values["output_tokens"] = output_tokens[i]
+            if trace.stages.get("generate"):
+                trace.values["tokens_per_second"] = output_tokens[i] / trace.stages["generate"]
+            if criteria:
+                trace.labels["stop_reason"] = criteria[0].stop_reasons[i] or "end"
+
+    def _postprocess(self, recipe: str, job: Dict[str, Any], trace: Optional[Trace] = None) -> str:
+        """Turn one generated text into the formatted recipe"""
+        trace = trace or Trace()
+        try:
             # Ensure English output
-            if not self._is_english(recipe):
+            with trace.stage("language_check"):
+                is_english = self._is_english(recipe)
+            if not is_english:
                 logger.warning("Non-English characters detected, using fallback recipe")
-                return self._get_fallback_recipe(ingredients)
-            
-            # Format the recipe
-            formatted_recipe = self._format_recipe(recipe, ingredient_list, enhanced_ingredients, difficulty)
+                return self._get_fallback_recipe(job["ingredients"])
             
-            # Add professional touches
-            chef_notes = self._generate_chef_notes(ingredient_list)
-            pairings = self._suggest_pairings(ingredient_list)
+            ingredient_list = job["ingredient_list"]
             
-            if chef_notes:
-                formatted_recipe += f"\n\n{chef_notes}"
-            if pairings:
-                formatted_recipe += f"\n\n{pairings}"
-                
-            return formatted_recipe.strip()
+            # Format the recipe
+            with trace.stage("format"):
+                formatted_recipe = self._format_recipe(recipe, ingredient_list, job["enhanced_ingredients"], job["difficulty"])
+            with trace.stage("chef_notes"):
+                return self._add_professional_touches(formatted_recipe, ingredient_list)
             
         except Exception as e:
             logger.error(f"Error generating recipe: {str(e)}")
-            return self._get_fallback_recipe(ingredients)
+            return self._get_fallback_recipe(job["ingredients"])
 
-    def _format_recipe(self, recipe: str, original_ingredients: List[str], 
-                      enhanced_ingredients: Dict[str, str], difficulty: Optional[str] = None) -> str:
-        """Format the recipe with proper sections and styling"""
+    def format_stored_recipe(self, stored: Dict[str, str], ingredients: str,
+                             difficulty: Optional[str] = None) -> str:
+        """
+        Format a recipe from the dataset (fields as parsed by recipe_index.parse_recipe)
+        the same way as a generated one
+        """
+        ingredient_list = [i.strip() for i in ingredients.split(',') if i.strip()]
         sections = {
-            "Description": "",
-            "Ingredients": "",
-            "Instructions": "",
+            "Description": " · ".join(stored[f] for f in ("Cuisine", "Dietary Info") if stored.get(f)),
+            "Ingredients": stored.get("Ingredients", ""),
+            "Instructions": stored.get("Instructions", ""),
             "Prep Time": "15 minutes",
-            "Cook Time": "30 minutes",
-            "Servings": "2-4",
+            "Cook Time": stored.get("Time") or "30 minutes",
+            "Servings": stored.get("Servings") or "2-4",
             "Difficulty": difficulty.capitalize() if difficulty else "Medium"
         }
+        formatted_recipe = self._render_recipe(stored.get("Title"), sections, ingredient_list, {})
+        return self._add_professional_touches(formatted_recipe, ingredient_list)
+
+    def _add_professional_touches(self, formatted_recipe: str, ingredient_list: List[str]) -> str:
+        """Append chef's notes and pairings"""
+        chef_notes = self._generate_chef_notes(ingredient_list)
+        pairings = self._suggest_pairings(ingredient_list)
         
-        # Extract or generate each section
-        lines = recipe.split('\n')
-        current_section = None
-        
-        for line in lines:
-            line_lower = line.lower().strip()
+        if chef_notes:
+            formatted_recipe += f"\n\n{chef_notes}"
+        if pairings:
+            formatted_recipe += f"\n\n{pairings}"
             
-            if "ingredient" in line_lower:
-                current_section = "Ingredients"
-                continue
-            elif "instruction" in line_lower or "direction" in line_lower:
-                current_section = "Instructions"
-                continue
-            elif "time" in line_lower:
-                current_section = "Cook Time"
-                continue
-            elif "serving" in line_lower:
-                current_section = "Servings"
-                continue
-            elif "description" in line_lower:
-                current_section = "Description"
-                continue
-            elif "difficulty" in line_lower:
-                current_section = "Difficulty"
-                continue
-                
-            if current_section and current_section in sections:
-                if not sections[current_section]:
-                    sections[current_section] = line.strip()
-                else:
-                    sections[current_section] += "\n" + line.strip()
-        
-        # Build the formatted recipe
+        return formatted_recipe.strip()
+
+    def _format_recipe(self, recipe: str, original_ingredients: List[str], 
+                      enhanced_ingredients: Dict[str, str], difficulty: Optional[str] = None) -> str:
+        """Format the recipe with proper sections and styling"""
+        # Extract or generate each section
+        parser = RecipeSectionParser(difficulty)
+        parser.feed(recipe)
+        parser.close()
+        return self._render_recipe(parser.title, parser.sections, original_ingredients, enhanced_ingredients)
+
+    def _render_recipe(self, title: Optional[str], sections: Dict[str, str], original_ingredients: List[str],
+                       enhanced_ingredients: Dict[str, str]) -> str:
+        """Build the formatted recipe from its title and sections"""
         formatted = []
         
         # Title and Description
-        title = next((line for line in lines if line.strip() and ":" not in line), "Delicious Recipe")
-        formatted.append(f"# {title.strip()}\n")
+        formatted.append(f"# {title or 'Delicious Recipe'}\n")
         
         if sections["Description"]:
             formatted.append(f"*{sections['Description']}*\n")
@@ -280,7 +837,17 @@ class RecipeGenerator:
         formatted.append(f"- ⚡ Difficulty: {sections['Difficulty']}")
         
         # Ingredients
-        formatted.append("\n## 🛒 Ingredients")
+        formatted.append("\n" + self._format_ingredients(sections, original_ingredients, enhanced_ingredients))
+        
+        # Instructions
+        formatted.append("\n" + self._format_instructions(sections))
+        
+        return "\n".join(formatted)
+
+    def _format_ingredients(self, sections: Dict[str, str], original_ingredients: List[str],
+                            enhanced_ingredients: Dict[str, str]) -> str:
+        """The Ingredients block of a formatted recipe"""
+        formatted = ["## 🛒 Ingredients"]
         if sections["Ingredients"]:
             formatted.append(sections["Ingredients"])
         else:
@@ -288,9 +855,11 @@ class RecipeGenerator:
             formatted.extend([f"- {enhanced_ingredients.get(ing, ing)}" for ing in original_ingredients])
             formatted.append("- Salt and pepper to taste")
             formatted.append("- 1-2 tablespoons olive oil or butter")
-        
-        # Instructions
-        formatted.append("\n## 👨‍🍳 Instructions")
+        return "\n".join(formatted)
+
+    def _format_instructions(self, sections: Dict[str, str]) -> str:
+        """The Instructions block of a formatted recipe"""
+        formatted = ["## 👨‍🍳 Instructions"]
         if sections["Instructions"]:
             # Ensure instructions are properly numbered
             instructions = [i.strip() for i in sections["Instructions"].split('\n') if i.strip()]
@@ -306,12 +875,11 @@ class RecipeGenerator:
                 "4. Season with salt and pepper to taste.",
                 "5. Serve hot and enjoy!"
             ])
-        
         return "\n".join(formatted)
 
-    def _get_fallback_recipe(self, ingredients: str) -> str:
+    def _get_fallback_recipe(self, ingredients: str) -> FallbackRecipe:
         """Generate a fallback recipe if generation fails"""
-        return f"""# Quick and Easy Recipe with {ingredients}
+        return FallbackRecipe(f"""# Quick and Easy Recipe with {ingredients}
 
 *This simple yet delicious recipe makes the most of your available ingredients.*
 
@@ -338,4 +906,4 @@ class RecipeGenerator:
 👨‍🍳 Chef's Note: For extra flavor, try adding a splash of lemon juice or a sprinkle of your favorite herbs and spices. You can also top with some grated cheese or a drizzle of olive oil before serving.
 
 🍷 Wine Pairing: A crisp white wine or light red would pair nicely with this dish.
-"""
\ No newline at end of file
+""")
\ No newline at end of file
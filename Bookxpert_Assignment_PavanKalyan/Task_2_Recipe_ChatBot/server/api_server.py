@@ -1,11 +1,21 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
-from ai_generate import RecipeGenerator
+from typing import Callable, Optional
+from ai_generate import FallbackRecipe, RecipeGenerator
+from batching import BatchScheduler
+from recipe_cache import RecipeCache, make_key
+from recipe_index import DEFAULT_DATASET_PATH, RecipeIndex
+from metrics import Registry, Trace
+import asyncio
+import json
 import logging
+import os
 import sys
-from fastapi.responses import JSONResponse
+import threading
+import time
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
 # Configure logging
 logging.basicConfig(
@@ -15,7 +25,116 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Generation settings (environment overridable)
+GENERATION_WORKERS = int(os.environ.get("RECIPE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Server processes sharing the model (serve.py); 1 when run directly
+PROCESSES = int(os.environ.get("RECIPE_PROCESSES", "1"))
+QUEUE_SIZE = int(os.environ.get("RECIPE_QUEUE_SIZE", str(4 * GENERATION_WORKERS)))
+REQUEST_TIMEOUT = float(os.environ.get("RECIPE_TIMEOUT", "120"))
+RETRY_AFTER = int(os.environ.get("RECIPE_RETRY_AFTER", "10"))
+MAX_BATCH_SIZE = int(os.environ.get("RECIPE_MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT = float(os.environ.get("RECIPE_MAX_BATCH_WAIT_MS", "20")) / 1000
+CACHE_SIZE = int(os.environ.get("RECIPE_CACHE_SIZE", "1000"))
+CACHE_TTL = float(os.environ.get("RECIPE_CACHE_TTL", "86400"))
+CACHE_PATH = os.environ.get("RECIPE_CACHE_PATH") or None
+# Seconds between saves of a changed cache to CACHE_PATH; 0 saves on shutdown only
+CACHE_SAVE_INTERVAL = float(os.environ.get("RECIPE_CACHE_SAVE_INTERVAL", "60"))
+RETRIEVAL_THRESHOLD = float(os.environ.get("RECIPE_RETRIEVAL_THRESHOLD", "0.8"))
+DATASET_PATH = os.environ.get("RECIPE_DATASET_PATH") or DEFAULT_DATASET_PATH
+INDEX_PATH = os.environ.get("RECIPE_INDEX_PATH") or None
+QUANTIZE = os.environ.get("RECIPE_QUANTIZE", "0").lower() in ("1", "true", "yes")
+# Split the cores between the workers instead of letting each one use all of them
+TORCH_THREADS = int(os.environ.get("RECIPE_TORCH_THREADS",
+                                   str(max(1, (os.cpu_count() or 1) // (GENERATION_WORKERS * PROCESSES)))))
+PREFIX_CACHE_SIZE = int(os.environ.get("RECIPE_PREFIX_CACHE_SIZE", "32"))
+ADAPTIVE_LENGTH = os.environ.get("RECIPE_ADAPTIVE_LENGTH", "1").lower() in ("1", "true", "yes")
+TIMING_HEADERS = os.environ.get("RECIPE_TIMING_HEADERS", "0").lower() in ("1", "true", "yes")
+# Shared by the server processes of serve.py, which sets it if unset
+METRICS_DIR = os.environ.get("RECIPE_METRICS_DIR") or None
+METRICS_INTERVAL = 5
+DISCONNECT_POLL = 0.5
+
+# Running + queued generations; a slot is freed when the generation is done
+CAPACITY = GENERATION_WORKERS * MAX_BATCH_SIZE + QUEUE_SIZE
+pending_slots = threading.BoundedSemaphore(CAPACITY)
+pending_lock = threading.Lock()
+pending_count = 0
+
+# Prometheus metrics, served by /metrics
+metrics = Registry()
+REQUESTS = metrics.counter("recipe_http_requests_total", "HTTP requests by endpoint and status code",
+                           ["endpoint", "status"])
+REQUEST_SECONDS = metrics.histogram("recipe_http_request_duration_seconds", "HTTP request latency (streams until the last event)",
+                                    ["endpoint"])
+STAGE_SECONDS = metrics.histogram("recipe_stage_duration_seconds", "Time per request spent in each stage",
+                                  ["stage"])
+RESPONSES = metrics.counter("recipe_responses_total", "Recipes served, by where they came from", ["source"])
+PROMPT_TOKENS = metrics.histogram("recipe_prompt_tokens", "Prompt tokens per generated recipe",
+                                  buckets=(16, 32, 48, 64, 96, 128, 256))
+OUTPUT_TOKENS = metrics.histogram("recipe_output_tokens", "Generated tokens per recipe",
+                                  buckets=(32, 64, 128, 192, 256, 384, 512, 768, 1000))
+TOKENS_PER_SECOND = metrics.histogram("recipe_tokens_per_second", "Decoding speed per generated recipe",
+                                      buckets=(5, 10, 20, 40, 80, 160, 320, 640))
+BATCH_SIZE = metrics.histogram("recipe_batch_size", "Size of the batch each recipe was generated in",
+                               buckets=(1, 2, 4, 8, 16, 32))
+STOPS = metrics.counter("recipe_generation_stops_total", "Why generations stopped (see RecipeStoppingCriteria)",
+                        ["reason"])
+
+# Endpoint label of the request metrics; other paths count as "other"
+ENDPOINTS = ("/", "/generate", "/generate/stream", "/health", "/ready", "/metrics")
+
+class MetricsMiddleware:
+    """
+    Gives every HTTP request a Trace (request.state.trace) and records it when
+    the response is finished: latency and status per endpoint, then the
+    stages, token counts and source the handlers recorded in the trace. With
+    RECIPE_TIMING_HEADERS the response gets a Server-Timing header with the
+    stages known when its headers are sent.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        scope.setdefault("state", {})["trace"] = trace
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if TIMING_HEADERS:
+                    timing = trace.server_timing(time.perf_counter() - start).encode("latin-1")
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            endpoint = scope["path"] if scope["path"] in ENDPOINTS else "other"
+            REQUESTS.inc(endpoint=endpoint, status=status)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            record_trace(trace)
+
+def record_trace(trace: Trace) -> None:
+    for stage, seconds in trace.stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    if "source" in trace.labels:
+        RESPONSES.inc(source=trace.labels["source"])
+    if "stop_reason" in trace.labels:
+        STOPS.inc(reason=trace.labels["stop_reason"])
+    for name, histogram in (("prompt_tokens", PROMPT_TOKENS), ("output_tokens", OUTPUT_TOKENS),
+                            ("tokens_per_second", TOKENS_PER_SECOND), ("batch_size", BATCH_SIZE)):
+        if name in trace.values:
+            histogram.observe(trace.values[name])
+
 app = FastAPI(title="Recipe Generator API", version="1.0")
+app.add_middleware(MetricsMiddleware)
 
 # Enable CORS
 app.add_middleware(
@@ -26,40 +145,296 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize generator
+# Initialize generator. Loaded at import, so serve.py can load it once and
+# fork worker processes that share the weights
 generator = None
 try:
-    generator = RecipeGenerator()
+    # RECIPE_QUANTIZE is applied in start_generation: quantizing runs torch
+    # ops, which must not happen in serve.py's master before it forks
+    generator = RecipeGenerator(quantize=False, num_threads=TORCH_THREADS,
+                                prefix_cache_size=PREFIX_CACHE_SIZE, adaptive_length=ADAPTIVE_LENGTH)
     logger.info("Model loaded successfully")
 except Exception as e:
     logger.error(f"Failed to load model: {str(e)}")
 
+# Generation runs in the scheduler's batch threads, off the event loop. They
+# are started by each server process (threads do not survive a fork)
+scheduler = None
+# Set once this process can generate; reported by /ready
+ready = False
+
+# Recipes by normalized request; RECIPE_CACHE_PATH keeps it across restarts
+recipe_cache = RecipeCache(CACHE_SIZE, CACHE_TTL, CACHE_PATH)
+
+# Stored recipes by ingredient; good matches are served without the model
+recipe_index = None
+try:
+    recipe_index = RecipeIndex.load(INDEX_PATH) if INDEX_PATH else RecipeIndex.from_dataset(DATASET_PATH)
+    logger.info(f"Recipe index loaded: {len(recipe_index)} stored recipes")
+except Exception as e:
+    logger.error(f"Failed to load recipe index: {str(e)}")
+retrieval_hits = 0
+
+# Single-flight: the generation in progress for each cache key
+in_flight = {}
+shared_generations = 0
+
 class RecipeRequest(BaseModel):
     ingredients: str
     category: Optional[str] = None
     cooking_time: Optional[int] = None
     difficulty: Optional[str] = None
 
+def _release_slot(_future) -> None:
+    global pending_count
+    with pending_lock:
+        pending_count -= 1
+    pending_slots.release()
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that calls on_close once it is done, also when its body was never iterated"""
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL)
+
+def _acquire_slot() -> None:
+    """Reserves a generation slot, or raises 429 (with Retry-After) when the queue is full"""
+    global pending_count
+    if not pending_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many recipes are being generated. Please try again later.",
+            headers={"Retry-After": str(RETRY_AFTER)}
+        )
+    with pending_lock:
+        pending_count += 1
+
+async def run_generation(request: Request, **kwargs) -> str:
+    """
+    Runs generator.generate_recipe through the batching scheduler.
+
+    Raises 429 (with Retry-After) when all workers are busy and the queue
+    is full, 504 after REQUEST_TIMEOUT seconds, and stops the generation
+    at its next token if the client disconnects.
+    """
+    _acquire_slot()
+
+    cancel_event = threading.Event()
+    try:
+        future = scheduler.submit(cancel_event=cancel_event, trace=request.state.trace, **kwargs)
+    except Exception:
+        _release_slot(None)
+        raise
+    future.add_done_callback(_release_slot)
+
+    job = asyncio.wrap_future(future)
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({job, watcher}, timeout=REQUEST_TIMEOUT,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if job in done:
+            return job.result()
+
+        # Queued jobs are dropped, running ones stop at the next token
+        cancel_event.set()
+        job.cancel()
+        if watcher in done:
+            logger.info("Client disconnected, generation cancelled")
+            raise HTTPException(status_code=499, detail="Client closed request")
+        raise HTTPException(status_code=504, detail=f"Recipe generation timed out after {REQUEST_TIMEOUT:g}s")
+    finally:
+        watcher.cancel()
+
+def retrieve(ingredients: str, category: Optional[str] = None, cooking_time: Optional[int] = None,
+             difficulty: Optional[str] = None) -> Optional[str]:
+    """
+    The best stored recipe of the category, formatted like a generated one, if it
+    scores RETRIEVAL_THRESHOLD or more. Blocking: call it through run_in_threadpool
+    """
+    global retrieval_hits
+    if recipe_index is None:
+        return None
+    stored, score = recipe_index.best_match(ingredients, cooking_time, category)
+    if stored is None or score < RETRIEVAL_THRESHOLD:
+        return None
+    retrieval_hits += 1
+    return generator.format_stored_recipe(stored, ingredients, difficulty)
+
+def _fail_shared(shared: asyncio.Future) -> None:
+    shared.set_exception(RuntimeError("Shared generation failed"))
+    shared.exception()  # retrieved, even if nobody was waiting
+
+async def generate_once(request: Request, **kwargs) -> str:
+    """
+    Serves a request from the stored recipes or the cache, or generates it
+    once for all identical requests in flight. If the shared generation fails
+    (e.g. its client disconnected) or only produced the fallback recipe, the
+    waiting requests generate on their own; fallbacks are never cached.
+    """
+    global shared_generations
+    trace = request.state.trace
+    # Invalid requests get their 400 before a stored or cached recipe can answer them
+    generator._validate_parameters(kwargs["ingredients"], kwargs.get("cooking_time"), kwargs.get("difficulty"))
+    with trace.stage("retrieval"):
+        recipe = await run_in_threadpool(retrieve, kwargs["ingredients"], kwargs.get("category"),
+                                         kwargs.get("cooking_time"), kwargs.get("difficulty"))
+    if recipe is not None:
+        trace.labels["source"] = "retrieval"
+        return recipe
+
+    with trace.stage("cache"):
+        key = make_key(kwargs["ingredients"], kwargs.get("category"),
+                       kwargs.get("cooking_time"), kwargs.get("difficulty"))
+        recipe = recipe_cache.get(key)
+    if recipe is not None:
+        trace.labels["source"] = "cache"
+        return recipe
+
+    shared = in_flight.get(key)
+    if shared is not None:
+        shared_generations += 1
+        try:
+            with trace.stage("shared_wait"):
+                recipe = await asyncio.shield(shared)
+            trace.labels["source"] = "shared"
+            return recipe
+        except Exception:
+            pass
+
+    shared = asyncio.get_running_loop().create_future()
+    in_flight[key] = shared
+    try:
+        recipe = await run_generation(request, **kwargs)
+        if isinstance(recipe, FallbackRecipe):
+            trace.labels["source"] = "fallback"
+            _fail_shared(shared)
+            return recipe
+        trace.labels["source"] = "generated"
+        recipe_cache.put(key, recipe)
+        shared.set_result(recipe)
+        return recipe
+    except BaseException:
+        _fail_shared(shared)
+        raise
+    finally:
+        if in_flight.get(key) is shared:
+            del in_flight[key]
+
+@app.on_event("startup")
+def start_generation():
+    """
+    Quantize (RECIPE_QUANTIZE) and warm the model and start the batch threads.
+    The server only accepts connections once this is done, so requests never
+    reach a cold process.
+    """
+    global scheduler, ready
+    if generator is None:
+        return
+    if QUANTIZE:
+        generator.quantize()
+    generator.warm_up()
+    scheduler = BatchScheduler(generator, MAX_BATCH_SIZE, MAX_BATCH_WAIT, workers=GENERATION_WORKERS)
+    ready = True
+    logger.info(f"Process {os.getpid()} ready")
+    
+    if METRICS_DIR:
+        threading.Thread(target=publish_metrics, name="metrics-publisher", daemon=True).start()
+
+def publish_metrics():
+    """Keep this process's snapshot in METRICS_DIR current, for /metrics answered by the other processes"""
+    while True:
+        try:
+            metrics.dump(METRICS_DIR)
+        except OSError as e:
+            logger.warning(f"Could not publish metrics: {str(e)}")
+        time.sleep(METRICS_INTERVAL)
+
+@app.on_event("shutdown")
+def stop_generation():
+    global ready
+    ready = False
+    if scheduler is not None:
+        scheduler.close()
+
+@app.on_event("startup")
+def start_cache_saver():
+    if CACHE_PATH and CACHE_SAVE_INTERVAL > 0:
+        threading.Thread(target=save_cache_periodically, name="cache-saver", daemon=True).start()
+
+def save_cache_periodically():
+    """Save the changed cache every CACHE_SAVE_INTERVAL seconds, so a crash loses at most that much"""
+    while True:
+        time.sleep(CACHE_SAVE_INTERVAL)
+        if recipe_cache.dirty:
+            try:
+                recipe_cache.save()
+            except OSError as e:
+                logger.warning(f"Could not save recipe cache: {str(e)}")
+
+@app.on_event("shutdown")
+def save_cache():
+    recipe_cache.save()
+
 @app.get("/")
 async def read_root():
     return {
         "status": "Recipe API is running",
         "endpoints": {
             "POST /generate": "Generate a recipe with given ingredients",
-            "GET /health": "Check API health"
+            "POST /generate/stream": "Stream a recipe as server-sent events while it is generated",
+            "GET /health": "Check API health",
+            "GET /ready": "Check that the server can generate recipes",
+            "GET /metrics": "Prometheus metrics"
         }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text format; with serve.py, summed over all server processes"""
+    return PlainTextResponse(metrics.render(METRICS_DIR), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 once the model is loaded and warm, 503 before that and while shutting down"""
+    content = {"status": "ready" if ready else "not ready", "pid": os.getpid()}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
+
 @app.get("/health")
 async def health_check():
+    """Liveness and statistics of this process"""
     return {
         "status": "healthy" if generator is not None else "error",
-        "model_loaded": generator is not None
+        "pid": os.getpid(),
+        "ready": ready,
+        "model_loaded": generator is not None,
+        "quantized": generator.quantized if generator else False,
+        "generation": {
+            "workers": GENERATION_WORKERS,
+            "pending": pending_count,
+            "capacity": CAPACITY,
+            "batching": scheduler.stats() if scheduler else None
+        },
+        "cache": {**recipe_cache.stats(), "shared_generations": shared_generations},
+        "retrieval": {
+            "stored_recipes": len(recipe_index) if recipe_index else 0,
+            "threshold": RETRIEVAL_THRESHOLD,
+            "hits": retrieval_hits
+        }
     }
 
 @app.post("/generate")
-async def generate_recipe(recipe_request: RecipeRequest):
-    if generator is None:
+async def generate_recipe(recipe_request: RecipeRequest, request: Request):
+    if not ready:
         raise HTTPException(
             status_code=503,
             detail="Recipe generator is not available. Please try again later."
@@ -67,17 +442,22 @@ async def generate_recipe(recipe_request: RecipeRequest):
     
     try:
         logger.info(f"Generating recipe for: {recipe_request.ingredients}")
-        recipe = generator.generate_recipe(
+        recipe = await generate_once(
+            request,
             ingredients=recipe_request.ingredients,
             category=recipe_request.category,
             cooking_time=recipe_request.cooking_time,
             difficulty=recipe_request.difficulty
         )
+        trace = request.state.trace
+        logger.info(f"Recipe served from {trace.labels.get('source')}: {trace.server_timing()}")
         return {
             "status": "success",
             "ingredients": recipe_request.ingredients,
             "recipe": recipe
         }
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -87,6 +467,88 @@ async def generate_recipe(recipe_request: RecipeRequest):
             detail=f"Failed to generate recipe: {str(e)}"
         )
 
+@app.post("/generate/stream")
+async def stream_recipe(recipe_request: RecipeRequest, request: Request):
+    """
+    Server-sent events: "token" for every decoded piece of text, "title" and
+    "section" with each formatted block as soon as it is complete, then
+    "recipe" with the full recipe. The generation stops when the client
+    disconnects or after REQUEST_TIMEOUT seconds.
+    """
+    if not ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Recipe generator is not available. Please try again later."
+        )
+    
+    # Raises ValueError (400) before anything is sent
+    generator._validate_parameters(recipe_request.ingredients, recipe_request.cooking_time,
+                                   recipe_request.difficulty)
+    
+    # A stored or cached recipe is sent as the only event
+    trace = request.state.trace
+    key = make_key(recipe_request.ingredients, recipe_request.category,
+                   recipe_request.cooking_time, recipe_request.difficulty)
+    with trace.stage("retrieval"):
+        recipe = await run_in_threadpool(retrieve, recipe_request.ingredients, recipe_request.category,
+                                         recipe_request.cooking_time, recipe_request.difficulty)
+    trace.labels["source"] = "retrieval"
+    if recipe is None:
+        with trace.stage("cache"):
+            recipe = recipe_cache.get(key)
+        trace.labels["source"] = "cache"
+    if recipe is not None:
+        event = json.dumps({"event": "recipe", "recipe": recipe}, ensure_ascii=False)
+        return StreamingResponse(iter([f"event: recipe\ndata: {event}\n\n"]), media_type="text/event-stream")
+    
+    _acquire_slot()
+    logger.info(f"Streaming recipe for: {recipe_request.ingredients}")
+    cancel_event = threading.Event()
+    timed_out = False
+    closed = False
+    
+    def time_out() -> None:
+        nonlocal timed_out
+        timed_out = True
+        cancel_event.set()
+    
+    timer = asyncio.get_running_loop().call_later(REQUEST_TIMEOUT, time_out)
+    
+    def close() -> None:
+        # Stops the model (client gone, or timed out) and frees the slot, exactly once
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        timer.cancel()
+        cancel_event.set()
+        _release_slot(None)
+    
+    try:
+        events = generator.stream_recipe(
+            ingredients=recipe_request.ingredients,
+            category=recipe_request.category,
+            cooking_time=recipe_request.cooking_time,
+            difficulty=recipe_request.difficulty,
+            cancel_event=cancel_event,
+            trace=trace,
+            slot=scheduler.slots
+        )
+        trace.labels["source"] = "generated"
+        
+        async def event_stream():
+            async for event in iterate_in_threadpool(events):
+                # Cached like /generate once complete; a recipe cut off by the timeout is not
+                if event["event"] == "recipe" and not timed_out and not isinstance(event["recipe"], FallbackRecipe):
+                    recipe_cache.put(key, event["recipe"])
+                yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        
+        return ClosingStreamingResponse(event_stream(), on_close=close, media_type="text/event-stream",
+                                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except Exception:
+        close()
+        raise
+
 @app.exception_handler(ValueError)
 async def value_error_handler(request: Request, exc: ValueError):
     return JSONResponse(
@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai_generate import RecipeGenerator
+from metrics import Trace
+
+logger = logging.getLogger(__name__)
+
+# (future, generate_recipe keyword arguments, cancel event, trace, submit time)
+Job = Tuple[Future, Dict[str, Any], Optional[threading.Event], Trace, float]
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching in front of RecipeGenerator.
+
+    Requests that arrive within max_wait seconds of the first queued one are
+    generated together (up to max_batch_size) in one batched model call; every
+    caller still gets its own formatted recipe through a Future.
+
+    At most `workers` model calls run at once: the batch threads hold one of
+    the `slots` while they generate, and streamed generations (which do not
+    go through the queue) take one too.
+    """
+    def __init__(self, generator: RecipeGenerator, max_batch_size: int = 8,
+                 max_wait: float = 0.02, workers: int = 1):
+        self.generator = generator
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.batched_requests = 0
+        self.slots = threading.BoundedSemaphore(max(1, workers))
+
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"recipe-batch-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, cancel_event: Optional[threading.Event] = None, trace: Optional[Trace] = None,
+               **request) -> Future:
+        """
+        Queue one request (generate_recipe keyword arguments); the Future resolves to the recipe.
+        The time spent waiting for a batch is recorded in trace as the "queue" stage.
+        """
+        future: Future = Future()
+        self._queue.put((future, request, cancel_event, trace or Trace(), time.perf_counter()))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_requests / self.batches, 2) if self.batches else 0.0
+        }
+
+    def _next_batch(self) -> Optional[List[Job]]:
+        """Wait for a request, then collect more until the batch is full or max_wait has passed"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if job is None:
+                # Leave the shutdown marker for this thread's next round
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            # Requests cancelled while they were queued are dropped here
+            batch = [job for job in batch if job[0].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.batched_requests += len(batch)
+            started = time.perf_counter()
+            for _, _, _, trace, submitted in batch:
+                trace.add("queue", started - submitted)
+                trace.values["batch_size"] = len(batch)
+            try:
+                with self.slots:
+                    recipes = self.generator.generate_recipes(
+                        [request for _, request, _, _, _ in batch],
+                        [cancel_event for _, _, cancel_event, _, _ in batch],
+                        [trace for _, _, _, trace, _ in batch]
+                    )
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} failed: {str(e)}")
+                for future, _, _, _, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (future, _, _, _, _), recipe in zip(batch, recipes):
+                future.set_result(recipe)
+
+    def close(self, timeout: float = 5) -> None:
+        """Stop the batch threads once the queued requests are done"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
@@ -0,0 +1,125 @@
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+import torch
+
+from ai_generate import RecipeGenerator
+from recipe_index import DEFAULT_DATASET_PATH
+
+def load_samples(path, limit: int) -> List[Dict[str, str]]:
+    """The first `limit` records of the dataset (input ingredients + output recipe)"""
+    samples = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("input") and record.get("output"):
+                samples.append(record)
+            if len(samples) >= limit:
+                break
+    return samples
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    """Size of the weights (tied weights counted once, int8 packed weights included)"""
+    seen = set()
+
+    def nbytes(value) -> int:
+        if isinstance(value, torch.Tensor):
+            if value.data_ptr() in seen:
+                return 0
+            seen.add(value.data_ptr())
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        return 0
+
+    return sum(nbytes(v) for v in model.state_dict().values()) / 2**20
+
+@torch.no_grad()
+def score_texts(generator: RecipeGenerator, texts: List[str]):
+    """Per-text loss and greedy next-token predictions under teacher forcing"""
+    tokenizer, model = generator.generator.tokenizer, generator.generator.model
+    losses, predictions = [], []
+    for text in texts:
+        input_ids = tokenizer(text, return_tensors="pt").input_ids.to(model.device)
+        output = model(input_ids, labels=input_ids)
+        losses.append(output.loss.item())
+        predictions.append(output.logits[0, :-1].argmax(-1))
+    return losses, predictions
+
+@torch.no_grad()
+def decode_speed(generator: RecipeGenerator, prompts: List[str], new_tokens: int) -> float:
+    """Greedy decoding speed in generated tokens per second"""
+    tokenizer, model = generator.generator.tokenizer, generator.generator.model
+    total_time = 0.0
+    for prompt in prompts:
+        inputs = tokenizer([prompt], return_tensors="pt", padding=True).to(model.device)
+        start = time.perf_counter()
+        model.generate(**inputs, do_sample=False, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                       pad_token_id=tokenizer.pad_token_id)
+        total_time += time.perf_counter() - start
+    return len(prompts) * new_tokens / total_time
+
+def run_check(samples: List[Dict[str, str]], new_tokens: int, threads: int) -> Dict[str, Any]:
+    torch.manual_seed(0)
+    full = RecipeGenerator(num_threads=threads)
+    quantized = RecipeGenerator(quantize=True, num_threads=threads)
+
+    texts = [s["output"] for s in samples]
+    prompts = [full._build_prompt(s["input"])["prompt"] for s in samples]
+
+    full_losses, full_predictions = score_texts(full, texts)
+    quant_losses, quant_predictions = score_texts(quantized, texts)
+    agreement = (
+        sum((a == b).sum().item() for a, b in zip(full_predictions, quant_predictions))
+        / sum(p.numel() for p in full_predictions)
+    )
+
+    # Warm up both models before timing
+    decode_speed(full, prompts[:1], 4)
+    decode_speed(quantized, prompts[:1], 4)
+    full_speed = decode_speed(full, prompts, new_tokens)
+    quant_speed = decode_speed(quantized, prompts, new_tokens)
+
+    full_ppl = torch.tensor(full_losses).mean().exp().item()
+    quant_ppl = torch.tensor(quant_losses).mean().exp().item()
+    return {
+        "samples": len(samples),
+        "threads": torch.get_num_threads(),
+        "perplexity": {"full": round(full_ppl, 3), "quantized": round(quant_ppl, 3),
+                       "increase": round(quant_ppl / full_ppl - 1, 4)},
+        "greedy_token_agreement": round(agreement, 4),
+        "tokens_per_second": {"full": round(full_speed, 1), "quantized": round(quant_speed, 1),
+                              "speedup": round(quant_speed / full_speed, 2)},
+        "model_size_mb": {"full": round(model_size_mb(full.generator.model), 1),
+                          "quantized": round(model_size_mb(quantized.generator.model), 1)}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the int8-quantized recipe model with the full-precision one.")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET_PATH), help="JSONL recipes with input/output fields")
+    parser.add_argument("--samples", type=int, default=20, help="recipes used for the checks")
+    parser.add_argument("--new-tokens", type=int, default=64, help="tokens generated per prompt for the speed check")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads (default: torch's own)")
+    parser.add_argument("--max-perplexity-increase", type=float, default=0.10,
+                        help="fail if the quantized perplexity is more than this fraction higher")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = run_check(load_samples(args.dataset, args.samples), args.new_tokens, args.threads)
+    report["passed"] = report["perplexity"]["increase"] <= args.max_perplexity_increase
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(0 if report["passed"] else 1)
+
+if __name__ == "__main__":
+    main()
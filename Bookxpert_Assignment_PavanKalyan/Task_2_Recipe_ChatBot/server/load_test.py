@@ -0,0 +1,272 @@
+"""
+Load test for api_server.py without GPT-2.
+
+The server runs in this process with FakeRecipeGenerator in place of
+RecipeGenerator: a stand-in with a configurable latency and token rate that
+returns recipe-shaped text, so the prompt building, batching, caching and
+formatting code all run as in production. /generate is driven over HTTP at
+fixed request rates with ingredient lists sampled from the dataset, and the
+report (throughput, latency percentiles, error and 429 rates, event-loop lag)
+is printed as JSON.
+
+The server under test is configured with the usual RECIPE_* environment
+variables (workers, batch size, queue, cache...). Stored-recipe retrieval
+is disabled: the sampled ingredient lists are the dataset's own, so each
+one would be answered from its stored recipe without generating.
+
+Usage:
+python load_test.py --rates 1 2 4 8 --duration 30 --token-rate 25 --output load_test.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+import ai_generate
+from metrics import Trace
+from recipe_index import DEFAULT_DATASET_PATH
+
+STEPS = [
+    "Heat {oil} in a large pan over medium heat.",
+    "Add the {a} and cook for 3-4 minutes, stirring occasionally.",
+    "Stir in the {b} and season with salt and pepper.",
+    "Cover and simmer for 10 minutes until everything is tender.",
+    "Taste and adjust the seasoning.",
+    "Garnish with fresh herbs and serve hot."
+]
+TITLES = ["Rustic", "Quick", "Golden", "Homestyle", "Spiced", "Garden"]
+DISHES = ["Skillet", "Stir Fry", "Bake", "Curry", "Hash", "Bowl"]
+
+class FakeRecipeGenerator(ai_generate.RecipeGenerator):
+    """
+    RecipeGenerator without a model: _sample sleeps like a batched generation
+    and returns recipe-shaped text, the same for the same prompt.
+
+    A batch takes latency + tokens / token_rate seconds, where tokens is the
+    longest text of the batch and every extra request in the batch slows
+    decoding down by batch_slowdown (0.1 = 10%). Only /generate is supported.
+    """
+    def __init__(self, latency: float = 0.05, token_rate: float = 25.0, batch_slowdown: float = 0.1,
+                 num_threads: Optional[int] = None, adaptive_length: bool = True, **kwargs):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.batch_slowdown = batch_slowdown
+        super().__init__(quantize=False, num_threads=num_threads, prefix_cache_size=0,
+                         adaptive_length=adaptive_length)
+
+    def _load_model(self, quantize: bool) -> None:
+        self.generator = None
+        self.quantized = False
+
+    def quantize(self) -> None:
+        pass
+
+    def _fake_text(self, job: Dict[str, Any]) -> str:
+        rng = random.Random(zlib.crc32(job["prompt"].encode("utf-8")))
+        ingredients = job["ingredient_list"]
+        a, b = ingredients[0], ingredients[-1]
+        steps = [step.format(oil=rng.choice(["olive oil", "butter"]), a=a, b=b)
+                 for step in STEPS[:rng.randint(4, len(STEPS))]]
+        lines = [f"{rng.choice(TITLES)} {a.title()} {rng.choice(DISHES)}", "", "Ingredients:"]
+        lines += [f"- {rng.randint(1, 4)} {ingredient}" for ingredient in ingredients]
+        lines += ["", "Instructions:"] + [f"{i}. {step}" for i, step in enumerate(steps, 1)]
+        lines += ["", f"Servings: {rng.randint(2, 6)}"]
+        text = "\n".join(lines)
+        # Without the adaptive length the model keeps writing until MAX_LENGTH
+        if not self.adaptive_length:
+            text += "\n\n" + " ".join(rng.choice(STEPS).format(oil="oil", a=a, b=b) for _ in range(60))
+        return text
+
+    def _sample(self, jobs: List[Dict[str, Any]], cancel_events: List[Optional[threading.Event]],
+                traces: List[Trace]) -> List[str]:
+        texts = [self._fake_text(job) for job in jobs]
+        # GPT-2 averages about four characters per token
+        tokens = [len(text) // 4 for text in texts]
+        duration = self.latency + max(tokens) / self.token_rate * (1 + self.batch_slowdown * (len(jobs) - 1))
+
+        start = time.perf_counter()
+        deadline = start + duration
+        while time.perf_counter() < deadline:
+            if all(event is not None and event.is_set() for event in cancel_events):
+                break
+            time.sleep(min(0.05, max(0.0, deadline - time.perf_counter())))
+        elapsed = time.perf_counter() - start
+
+        for job, trace, count in zip(jobs, traces, tokens):
+            trace.add("generate", elapsed)
+            trace.values["prompt_tokens"] = len(job["prompt"]) // 4
+            trace.values["output_tokens"] = count
+            trace.values["tokens_per_second"] = count / elapsed if elapsed else 0.0
+            trace.labels["stop_reason"] = "complete" if self.adaptive_length else "budget"
+        return [job["prompt"] + text for job, text in zip(jobs, texts)]
+
+def load_ingredients(path) -> List[str]:
+    """The "input" ingredient lists of the dataset"""
+    ingredients = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("input"):
+                ingredients.append(record["input"])
+    return ingredients
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile; 0 for no values"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Percentiles in milliseconds"""
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "max": round(max(values, default=0.0) * 1000, 1)
+    }
+
+class LagProbe:
+    """Measures how late the server's event loop wakes up from a short sleep"""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def take(self) -> List[float]:
+        samples, self.samples = self.samples, []
+        return samples
+
+async def run_rate(client: httpx.AsyncClient, rate: float, duration: float,
+                   ingredients: List[str], rng: random.Random) -> Dict[str, Any]:
+    """Send rate requests per second for duration seconds (open loop) and wait for all of them"""
+    latencies, statuses = [], []
+
+    async def one(payload: Dict[str, str]) -> None:
+        start = time.perf_counter()
+        try:
+            response = await client.post("/generate", json=payload)
+            statuses.append(response.status_code)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            statuses.append(None)
+
+    count = max(1, int(rate * duration))
+    start = time.perf_counter()
+    tasks = []
+    for i in range(count):
+        # Arrivals on a fixed schedule, whether or not earlier requests are done
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one({"ingredients": rng.choice(ingredients)})))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "rate": rate,
+        "requests": count,
+        "succeeded": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "error_rate": round(sum(1 for s in statuses if s is None or (s != 200 and s != 429)) / count, 4),
+        "rate_429": round(statuses.count(429) / count, 4)
+    }
+
+async def run_load(base_url: str, rates: List[float], duration: float, ingredients: List[str],
+                   seed: int, timeout: float, api_server, probe: LagProbe) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    results = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for rate in rates:
+            # Every rate starts from an empty cache, so runs are comparable
+            api_server.recipe_cache = api_server.RecipeCache(api_server.CACHE_SIZE, api_server.CACHE_TTL)
+            probe.take()
+            result = await run_rate(client, rate, duration, ingredients, rng)
+            result["event_loop_lag_ms"] = summarize(probe.take())
+
+            health = (await client.get("/health")).json()
+            result["server"] = {"batching": health["generation"]["batching"], "cache": health["cache"]}
+            results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /generate with a stand-in recipe generator.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8], help="requests per second, one run each")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic per rate")
+    parser.add_argument("--latency", type=float, default=0.05, help="fixed seconds per generated batch")
+    parser.add_argument("--token-rate", type=float, default=25, help="generated tokens per second of one sequence")
+    parser.add_argument("--batch-slowdown", type=float, default=0.1,
+                        help="decoding slowdown per extra request in a batch (0.1 = 10%%)")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET_PATH), help="JSONL recipes to sample ingredients from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per request")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # api_server builds its generator when it is imported
+    settings = {"latency": args.latency, "token_rate": args.token_rate, "batch_slowdown": args.batch_slowdown}
+    ai_generate.RecipeGenerator = lambda **kwargs: FakeRecipeGenerator(**settings, **kwargs)
+    import api_server
+    api_server.recipe_index = None
+
+    probe = LagProbe()
+
+    @api_server.app.on_event("startup")
+    async def start_probe():
+        asyncio.get_running_loop().create_task(probe.run())
+
+    server = uvicorn.Server(uvicorn.Config(api_server.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("The server under test did not start")
+        time.sleep(0.05)
+
+    try:
+        results = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.rates, args.duration,
+                                       load_ingredients(args.dataset), args.seed, args.timeout, api_server, probe))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    report = {
+        "generator": settings,
+        "server": {
+            "workers": api_server.GENERATION_WORKERS,
+            "capacity": api_server.CAPACITY,
+            "max_batch_size": api_server.MAX_BATCH_SIZE,
+            "max_batch_wait_ms": round(api_server.MAX_BATCH_WAIT * 1000, 1),
+            "cache_size": api_server.CACHE_SIZE,
+            "adaptive_length": api_server.ADAPTIVE_LENGTH
+        },
+        "duration_seconds": args.duration,
+        "seed": args.seed,
+        "results": results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Snapshot in a metrics directory holding the sum of the processes that exited
+DEAD_PROCESSES_FILE = "dead.json"
+# Seconds, from a cache hit to a full-length CPU generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+
+class Trace:
+    """Stage durations, token counts and labels of one request"""
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.values: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add time to a stage (a stage can run more than once, e.g. per batch)"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """The stages as a Server-Timing header value (milliseconds)"""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = json.dumps([str(labels[name]) for name in self.labelnames])
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets[-1] == math.inf else tuple(buckets) + (math.inf,)
+        # label key -> per-bucket counts (not cumulative), then sum and count
+        self._values: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = json.dumps([str(labels[name]) for name in self.labelnames])
+        bucket = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            values = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            values[bucket] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        with self._lock:
+            return {key: list(values) for key, values in self._values.items()}
+
+class Registry:
+    """
+    Counters and histograms rendered in the Prometheus text format.
+
+    Several server processes can publish one set of metrics: each one writes
+    its snapshot to a shared directory (dump), and render(directory) adds up
+    the snapshots of all of them. mark_process_dead folds the snapshot of a
+    process that exited into one file, so the directory does not grow with
+    every restarted worker and the totals do not drop.
+    """
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def dump(self, directory: str) -> None:
+        """Write this process's snapshot to directory (write-then-rename)"""
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """This process's metrics, or the sum over all snapshots in directory"""
+        snapshots = [self.snapshot()]
+        if directory:
+            self.dump(directory)
+            snapshots = []
+            for path in glob.glob(os.path.join(directory, "*.json")):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        totals = _merge(snapshots)
+        lines = []
+        for metric in self.metrics:
+            merged = totals.get(metric.name, {})
+            kind = "histogram" if isinstance(metric, Histogram) else "counter"
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for key, value in sorted(merged.items()):
+                labels = [f'{name}="{label}"' for name, label in zip(metric.labelnames, json.loads(key))]
+                if kind == "counter":
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(metric.buckets, value):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == math.inf else f'le="{_number(bound)}"'
+                    lines.append(f"{metric.name}_bucket{_labels(labels + [le])} {_number(cumulative)}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {_number(value[-1])}")
+        return "\n".join(lines) + "\n"
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """
+    Add the last snapshot of an exited process to DEAD_PROCESSES_FILE and
+    remove its own file (only call it once the process has exited).
+    """
+    path = os.path.join(directory, f"{pid}.json")
+    dead_path = os.path.join(directory, DEAD_PROCESSES_FILE)
+    snapshots = []
+    for source in (dead_path, path):
+        try:
+            with open(source, 'r', encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    if os.path.exists(path):
+        with open(dead_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(_merge(snapshots), f)
+        os.replace(dead_path + ".tmp", dead_path)
+    for leftover in (path, path + ".tmp"):
+        try:
+            os.remove(leftover)
+        except FileNotFoundError:
+            pass
+
+def clear_directory(directory: str) -> None:
+    """Remove the snapshots of an earlier run from directory"""
+    for path in glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.json.tmp")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _merge(snapshots: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Sum of snapshots, per metric and label key"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            metric = merged.setdefault(name, {})
+            for key, value in values.items():
+                if isinstance(value, list):
+                    total = metric.setdefault(key, [0.0] * len(value))
+                    metric[key] = [a + b for a, b in zip(total, value)]
+                else:
+                    metric[key] = metric.get(key, 0.0) + value
+    return merged
+
+def _labels(labels: List[str]) -> str:
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[Tuple[str, ...], Optional[str], Optional[int], Optional[str]]
+
+def make_key(ingredients: str, category: Optional[str] = None,
+             cooking_time: Optional[int] = None, difficulty: Optional[str] = None) -> CacheKey:
+    """
+    Cache key of a /generate request.
+
+    The ingredients become a sorted set of lower-cased, whitespace-collapsed
+    names, so "egg, onion" and "Onion,Egg " share a key; category "all" is
+    the same as no category, as in the prompt.
+    """
+    names = {" ".join(i.lower().split()) for i in ingredients.split(',')}
+    names.discard("")
+
+    category = " ".join(category.lower().split()) if category else None
+    if category == "all":
+        category = None
+
+    difficulty = difficulty.strip().lower() if difficulty else None
+    return tuple(sorted(names)), category or None, cooking_time or None, difficulty or None
+
+class RecipeCache:
+    """Thread-safe LRU cache of formatted recipes with a TTL and optional file persistence"""
+    def __init__(self, max_size: int = 1000, ttl: float = 86400, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False  # changed since the last save()
+        self._entries: "OrderedDict[CacheKey, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path:
+            self.load()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: CacheKey, recipe: str) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (recipe, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            self.dirty = True
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def load(self) -> None:
+        """Load the unexpired entries saved by save(), at most max_size of them"""
+        if not self.path or self.max_size <= 0 or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable recipe cache {self.path}: {str(e)}")
+            return
+
+        now = time.time()
+        with self._lock:
+            # Saved least recently used first, so the LRU order survives
+            for (names, category, cooking_time, difficulty), recipe, expires_at in entries:
+                if expires_at > now:
+                    self._entries[(tuple(names), category, cooking_time, difficulty)] = (recipe, expires_at)
+            # A file saved with a larger RECIPE_CACHE_SIZE keeps its most recently used entries
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} cached recipes from {self.path}")
+
+    def save(self) -> None:
+        """Write the cache to its file (write-then-rename, so a crash never leaves half a file)"""
+        if not self.path:
+            return
+        with self._lock:
+            entries = [[list(key), recipe, expires_at] for key, (recipe, expires_at) in self._entries.items()]
+            self.dirty = False
+
+        # Per process, as several server processes may save the same file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self.dirty = True
+            raise
+        logger.info(f"Saved {len(entries)} cached recipes to {self.path}")
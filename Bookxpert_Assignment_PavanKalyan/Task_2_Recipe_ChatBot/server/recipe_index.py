@@ -0,0 +1,145 @@
+import argparse
+import json
+import logging
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET_PATH = Path(__file__).resolve().parent.parent / "data_set" / "recipes_enhanced.jsonl"
+
+# "Field: value" lines of the dataset's output text
+RECIPE_FIELDS = ("Title", "Ingredients", "Instructions", "Time", "Servings", "Cuisine", "Dietary Info")
+FIELD_PATTERN = re.compile(r"^(" + "|".join(RECIPE_FIELDS) + r"):\s*(.*)$")
+
+def normalize_ingredient(ingredient: str) -> str:
+    """Lower-case, collapse spaces and drop a plural ending ("Tomatoes" -> "tomato")"""
+    words = ingredient.lower().split()
+    if not words:
+        return ""
+    last = words[-1]
+    if last.endswith("oes"):
+        last = last[:-2]
+    elif last.endswith("s") and not last.endswith("ss") and len(last) > 3:
+        last = last[:-1]
+    return " ".join(words[:-1] + [last])
+
+def ingredient_set(ingredients: str) -> frozenset:
+    names = {normalize_ingredient(i) for i in ingredients.split(',')}
+    names.discard("")
+    return frozenset(names)
+
+def parse_recipe(output: str) -> Dict[str, str]:
+    """Split a dataset recipe ("Title: ...", "Ingredients:", ...) into its fields"""
+    fields: Dict[str, str] = {}
+    current = None
+    for line in output.split('\n'):
+        match = FIELD_PATTERN.match(line.strip())
+        if match:
+            current = match.group(1)
+            fields[current] = match.group(2).strip()
+        elif current and line.strip():
+            fields[current] = (fields[current] + "\n" + line.strip()).strip()
+    return fields
+
+def _minutes(time_field: Optional[str]) -> Optional[int]:
+    match = re.search(r"\d+", time_field or "")
+    return int(match.group()) if match else None
+
+# Fields a requested category ("Indian", "Vegetarian", "Curry"...) is looked up in
+CATEGORY_FIELDS = ("Title", "Cuisine", "Dietary Info")
+
+def _category_pattern(category: Optional[str]) -> Optional["re.Pattern"]:
+    """Whole-word, case-insensitive match; "Vegetarian" does not match "Non-vegetarian". None for no category"""
+    if not category or not category.strip() or category.strip().lower() == "all":
+        return None
+    return re.compile(r"(?<![\w-])" + re.escape(category.strip()) + r"(?![\w-])", re.IGNORECASE)
+
+class RecipeIndex:
+    """Inverted index from normalized ingredient to the stored recipes that use it"""
+    def __init__(self, recipes: List[Dict[str, Any]]):
+        """
+        recipes: {"ingredients": [normalized names], "recipe": parse_recipe fields}
+        """
+        self.recipes = recipes
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for recipe_id, recipe in enumerate(recipes):
+            for name in recipe["ingredients"]:
+                self.postings[name].append(recipe_id)
+
+    def __len__(self):
+        return len(self.recipes)
+
+    @classmethod
+    def from_dataset(cls, path=DEFAULT_DATASET_PATH) -> "RecipeIndex":
+        """Build the index from a JSONL dataset with "input" (ingredients) and "output" (recipe) fields"""
+        recipes = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                names = ingredient_set(record.get("input", ""))
+                if names and record.get("output"):
+                    recipes.append({"ingredients": sorted(names), "recipe": parse_recipe(record["output"])})
+        return cls(recipes)
+
+    @classmethod
+    def load(cls, path) -> "RecipeIndex":
+        """Load an index written by save()"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)["recipes"])
+
+    def save(self, path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"recipes": self.recipes}, f, ensure_ascii=False)
+
+    def best_match(self, ingredients: str, cooking_time: Optional[int] = None,
+                   category: Optional[str] = None) -> Tuple[Optional[Dict[str, str]], float]:
+        """
+        The stored recipe with the highest ingredient overlap (Jaccard similarity
+        of the ingredient sets), skipping recipes that take longer than cooking_time
+        and, with a category, recipes whose title, cuisine and dietary info do not mention it.
+
+        Returns:
+        - (recipe fields, score), or (None, 0.0) if no recipe shares an ingredient
+        """
+        query = ingredient_set(ingredients)
+        shared = defaultdict(int)
+        for name in query:
+            for recipe_id in self.postings.get(name, ()):
+                shared[recipe_id] += 1
+
+        pattern = _category_pattern(category)
+        best, best_key = None, None
+        for recipe_id, overlap in shared.items():
+            recipe = self.recipes[recipe_id]
+            if cooking_time:
+                minutes = _minutes(recipe["recipe"].get("Time"))
+                if minutes is not None and minutes > cooking_time:
+                    continue
+            if pattern and not any(pattern.search(recipe["recipe"].get(field, "")) for field in CATEGORY_FIELDS):
+                continue
+            score = overlap / (len(query) + len(recipe["ingredients"]) - overlap)
+            # Highest score first, then the lower id
+            key = (score, -recipe_id)
+            if best_key is None or key > best_key:
+                best, best_key = recipe, key
+
+        if best is None:
+            return None, 0.0
+        return best["recipe"], best_key[0]
+
+# Precompute the index file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the ingredient -> recipe index used by api_server.py")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET_PATH), help="JSONL recipes with input/output fields")
+    parser.add_argument("--output", required=True, help="index file to write (set RECIPE_INDEX_PATH to it)")
+    args = parser.parse_args()
+
+    index = RecipeIndex.from_dataset(args.dataset)
+    index.save(args.output)
+    print(f"Indexed {len(index)} recipes ({len(index.postings)} ingredients) into {args.output}")
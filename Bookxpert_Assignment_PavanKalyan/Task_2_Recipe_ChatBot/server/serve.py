@@ -0,0 +1,126 @@
+"""
+Production server: loads the model once, then forks RECIPE_PROCESSES worker
+processes that share its weights copy-on-write and accept connections from
+one listening socket.
+
+The weights are never written after loading, so their pages stay shared and
+each extra process costs its own Python heap and activations instead of a
+full copy of GPT-2, and starts without loading anything. A worker that dies
+is replaced by a new fork of the loaded master.
+
+POSIX only (it needs os.fork); on Windows run uvicorn api_server:app.
+
+Usage:
+RECIPE_PROCESSES=4 python serve.py --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+
+import uvicorn
+
+# Checked before the model is loaded
+if not hasattr(os, "fork"):
+    sys.exit("serve.py needs os.fork, which this platform does not have; run uvicorn api_server:app instead")
+
+# Loads the model in the master process
+import api_server
+from metrics import clear_directory, mark_process_dead
+
+logger = logging.getLogger(__name__)
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(sock: socket.socket) -> None:
+    """Body of a forked worker: one uvicorn server on the shared socket"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # The warm-up and batch threads start in api_server's startup event, in this process
+    server = uvicorn.Server(uvicorn.Config(api_server.app, log_level="info"))
+    server.run(sockets=[sock])
+
+def serve(host: str, port: int, processes: int) -> None:
+    if api_server.generator is None:
+        sys.exit("The recipe model could not be loaded")
+
+    sock = _listen(host, port)
+    # /metrics adds up the snapshots the processes write here
+    metrics_dir = None
+    if not api_server.METRICS_DIR:
+        metrics_dir = api_server.METRICS_DIR = tempfile.mkdtemp(prefix="recipe-metrics-")
+    else:
+        # Snapshots left by the processes of an earlier run would be added in
+        os.makedirs(api_server.METRICS_DIR, exist_ok=True)
+        clear_directory(api_server.METRICS_DIR)
+    # Objects created so far are never collected, so the collector does not
+    # write to (and un-share) their pages in the workers
+    gc.freeze()
+
+    workers = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock)
+            finally:
+                os._exit(0)
+        workers[pid] = True
+        logger.info(f"Started worker process {pid}")
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(processes):
+        spawn()
+    logger.info(f"Serving on {host}:{port} with {processes} processes")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if workers.pop(pid, None) is None:
+            continue
+        try:
+            mark_process_dead(api_server.METRICS_DIR, pid)
+        except OSError as e:
+            logger.warning(f"Could not fold the metrics of worker process {pid}: {str(e)}")
+        if not stopping:
+            logger.warning(f"Worker process {pid} exited with status {status}, starting a new one")
+            spawn()
+
+    sock.close()
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the recipe API from several processes sharing one loaded model.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    # Set with RECIPE_PROCESSES, which also splits the torch threads between the processes
+    serve(args.host, args.port, api_server.PROCESSES)